@@ -91,7 +91,30 @@ export default function App() {
       });
       const raw = (data || []).map((t) => ({ ...t, url: toPublicUrl(t.url) }));
 
-      // Generate caption-placed previews for each suggested template
+      // All captioned previews in one sprite sheet (one request, one image decode)
+      try {
+        const { data: sheet } = await axios.post(`${API_BASE}/sprites`, {
+          templates: raw,
+          captioned: true,
+          safety_level: safetyLevel,
+        });
+        const sheetUrl = toPublicUrl(sheet.sheet);
+        setTemplates(
+          raw.map((t, i) => {
+            const it = sheet.items[i];
+            if (!it?.ok) return t;
+            return {
+              ...t,
+              sprite: { src: sheetUrl, x: it.x, y: it.y, w: it.w, h: it.h, width: sheet.width, height: sheet.height },
+            };
+          })
+        );
+        return;
+      } catch (e) {
+        console.warn("Sprite sheet failed, rendering previews one by one", e);
+      }
+
+      // Fallback: generate caption-placed previews for each suggested template
       const generated = await Promise.all(
         raw.map(async (t) => {
           if (!t.caption) return t;
@@ -1,20 +1,43 @@
 // components/MemeCard.jsx
 import React from "react";
 
+// One cell of a /sprites sheet, scaled to the card width (CSS sprite with percentages)
+function SpriteImage({ sprite, name }) {
+  const { src, x, y, w, h, width, height } = sprite;
+  const pos = (offset, size, total) => (total > size ? (offset / (total - size)) * 100 : 0);
+  return (
+    <div
+      role="img"
+      aria-label={name}
+      className="w-full rounded-lg shadow-lg border border-gray-700"
+      style={{
+        aspectRatio: `${w} / ${h}`,
+        backgroundImage: `url(${src})`,
+        backgroundSize: `${(width / w) * 100}% ${(height / h) * 100}%`,
+        backgroundPosition: `${pos(x, w, width)}% ${pos(y, h, height)}%`,
+      }}
+    />
+  );
+}
+
 export default function MemeCard({ template, onEdit, onStar, starred }) {
-  const { name, url, source } = template;
+  const { name, url, source, sprite } = template;
   return (
     <div className="flex flex-col">
       <div className="relative">
-        <img
-          src={url}
-          alt={name}
-          className="w-full rounded-lg shadow-lg border border-gray-700"
-          onError={(e) => {
-            e.currentTarget.src =
-              "https://via.placeholder.com/600x600.png?text=Image+unavailable";
-          }}
-        />
+        {sprite ? (
+          <SpriteImage sprite={sprite} name={name} />
+        ) : (
+          <img
+            src={url}
+            alt={name}
+            className="w-full rounded-lg shadow-lg border border-gray-700"
+            onError={(e) => {
+              e.currentTarget.src =
+                "https://via.placeholder.com/600x600.png?text=Image+unavailable";
+            }}
+          />
+        )}
         <button
           className={`absolute top-2 right-2 px-2 py-1 rounded text-xs ${
             starred ? "bg-yellow-400 text-black" : "bg-gray-800 text-gray-200"
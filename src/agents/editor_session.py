@@ -0,0 +1,173 @@
+"""
+editor_session.py
+-----------------
+Server-side state for the meme editor.
+
+A session decodes the template once and keeps one small RGBA layer per text
+box (cropped to the box's ink, with its offset). Editing a box re-rasterizes
+only that layer; the composited frame is repaired only inside the union of the
+box's old and new rectangles, so an edit costs roughly the size of the box,
+not of the template.
+"""
+
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+from src.agents.meme_generator_agent import _draw_layout_box, _layout_box
+from src.utils.cache import TTLCache
+from src.utils.config import EDITOR_SESSION_MAX, EDITOR_SESSION_TTL
+from src.utils.image_cache import get_template_image
+from src.utils.output_spec import encode, fit_to, get_spec
+from src.utils.text_measure import get_measurer
+
+Rect = Tuple[int, int, int, int]
+
+
+def _union(a: Optional[Rect], b: Optional[Rect]) -> Optional[Rect]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+def _intersect(a: Rect, b: Rect) -> Optional[Rect]:
+    r = max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])
+    return r if r[0] < r[2] and r[1] < r[3] else None
+
+
+class _Layer:
+    __slots__ = ("box", "image", "rect")
+
+    def __init__(self, box: dict, image: Optional[Image.Image], rect: Optional[Rect]):
+        self.box = box
+        self.image = image
+        self.rect = rect
+
+
+class EditorSession:
+    def __init__(self, template: dict, max_dim: Optional[int] = None):
+        self.template = template
+        self.max_dim = max_dim
+        # Reduced decode, then exact downscale: layers are rasterized at preview scale
+        self.base = fit_to(get_template_image(template["url"], max_dim), max_dim)
+        self.frame = self.base.copy()
+        self.layers: List[_Layer] = []
+        self.lock = threading.Lock()
+        self.edits = 0
+        self.last_edit_ms = 0.0
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.base.size
+
+    # ---------- Layers ----------
+    def _rasterize(self, box: dict) -> _Layer:
+        """Draw one box onto a transparent canvas covering just its text block."""
+        if not (box.get("text") or "").strip():
+            return _Layer(box, None, None)
+        W, H = self.base.size
+        font, emoji_font, placed = _layout_box(box, W, H)
+        measurer = get_measurer(font, emoji_font)
+        pad = getattr(font, "size", 32)  # stroke, descenders and emoji sprites drawn above the line
+        # Lines may be wider than the box (one long word) and start left of it;
+        # the full render does not clip them, so neither may the layer
+        x0 = min(lx for _, lx, _ in placed) - pad
+        y0 = min(ly for _, _, ly in placed) - pad
+        x1 = max(lx + measurer.line_width(line) for line, lx, _ in placed) + pad
+        y1 = max(ly for _, _, ly in placed) + 2 * pad
+        canvas = Image.new("RGBA", (max(1, x1 - x0), max(1, y1 - y0)), (0, 0, 0, 0))
+        _draw_layout_box(canvas, ImageDraw.Draw(canvas), box, W, H, origin=(x0, y0))
+
+        ink = canvas.getbbox()
+        if ink is None:
+            return _Layer(box, None, None)
+        rect = _intersect((x0 + ink[0], y0 + ink[1], x0 + ink[2], y0 + ink[3]), (0, 0, W, H))
+        if rect is None:
+            return _Layer(box, None, None)
+        return _Layer(box, canvas.crop((rect[0] - x0, rect[1] - y0, rect[2] - x0, rect[3] - y0)), rect)
+
+    def _repair(self, region: Optional[Rect]) -> None:
+        """Restore `region` of the frame from the base and re-composite the layers over it."""
+        if region is None:
+            return
+        region = _intersect(region, (0, 0) + self.base.size)
+        if region is None:
+            return
+        self.frame.paste(self.base.crop(region), region[:2])
+        for layer in self.layers:
+            if layer.rect is None:
+                continue
+            part = _intersect(layer.rect, region)
+            if part is None:
+                continue
+            lx, ly = layer.rect[:2]
+            piece = layer.image.crop((part[0] - lx, part[1] - ly, part[2] - lx, part[3] - ly))
+            self.frame.paste(piece, part[:2], piece)
+
+    # ---------- Edits ----------
+    def set_boxes(self, boxes: List[dict]) -> List[int]:
+        """Apply the editor's full box list; only boxes that changed (by index) are re-rasterized."""
+        t0 = time.perf_counter()
+        with self.lock:
+            dirty: Optional[Rect] = None
+            changed = []
+            for i, box in enumerate(boxes):
+                old = self.layers[i] if i < len(self.layers) else None
+                if old is not None and old.box == box:
+                    continue
+                layer = self._rasterize(box)
+                dirty = _union(dirty, _union(old.rect if old else None, layer.rect))
+                if old is None:
+                    self.layers.append(layer)
+                else:
+                    self.layers[i] = layer
+                changed.append(i)
+            for old in self.layers[len(boxes):]:
+                dirty = _union(dirty, old.rect)
+            del self.layers[len(boxes):]
+            self._repair(dirty)
+            self.edits += 1
+            self.last_edit_ms = (time.perf_counter() - t0) * 1000
+        return changed
+
+    def encode(self, output: Optional[str] = "preview") -> bytes:
+        """Encode the current frame with an output preset."""
+        with self.lock:
+            frame = self.frame.copy()
+        return encode(frame, get_spec(output))
+
+    def boxes(self) -> List[dict]:
+        return [layer.box for layer in self.layers]
+
+
+class EditorSessionStore:
+    """Open sessions by id; idle sessions expire after EDITOR_SESSION_TTL."""
+
+    def __init__(self, maxsize: int = EDITOR_SESSION_MAX, ttl: float = EDITOR_SESSION_TTL):
+        self._sessions = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def create(self, template: dict, max_dim: Optional[int] = None) -> Tuple[str, EditorSession]:
+        sid = uuid.uuid4().hex
+        session = EditorSession(template, max_dim)
+        self._sessions.set(sid, session)
+        return sid, session
+
+    def get(self, sid: str) -> Optional[EditorSession]:
+        session = self._sessions.get(sid)
+        if session is not None:
+            self._sessions.set(sid, session)  # sliding expiry
+        return session
+
+    def close(self, sid: str) -> None:
+        self._sessions.pop(sid)
+
+    def stats(self) -> dict:
+        return self._sessions.stats()
+
+
+editor_sessions = EditorSessionStore()
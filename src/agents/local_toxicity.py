@@ -0,0 +1,200 @@
+"""
+local_toxicity.py
+-----------------
+Offline toxicity scoring on CPU (unitary/toxic-bert or a distilled variant).
+
+Captions submitted from concurrent requests are collected for a short
+micro-batching window and scored in one forward pass. The model is loaded
+once, at API startup (warmup) or on first use; with TOXICITY_OFFLINE it is
+read from the local HF cache (or TOXICITY_MODEL pointing at a local
+directory) and never touches the network. A failed load is remembered and
+reported on every call instead of being retried per batch; requests wait for
+a load in progress (up to TOXICITY_LOAD_TIMEOUT) rather than timing out on it.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional
+
+from src.utils.config import (
+    TOXICITY_LOAD_TIMEOUT,
+    TOXICITY_MODEL,
+    TOXICITY_OFFLINE,
+    TOXICITY_BATCH_WINDOW_MS,
+    TOXICITY_MAX_BATCH,
+)
+
+# Labels that mean "not toxic" in single-label (softmax) classifiers
+_NEUTRAL_LABELS = {"neutral", "non-toxic", "non_toxic", "not_toxic", "label_0", "ok", "clean"}
+
+
+class LocalToxicityScorer:
+    """Micro-batching wrapper around a sequence-classification model."""
+
+    def __init__(self, model_name: str = TOXICITY_MODEL, window_ms: int = TOXICITY_BATCH_WINDOW_MS,
+                 max_batch: int = TOXICITY_MAX_BATCH, offline: bool = TOXICITY_OFFLINE):
+        self.model_name = model_name
+        self.window = max(0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.offline = offline
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._load_error: Optional[BaseException] = None
+        self._tokenizer = None
+        self._model = None
+        self._toxic_idx: List[int] = []
+        self._multi_label = True
+        # per-batch latency stats
+        self.batches = 0
+        self.items = 0
+        self.total_ms = 0.0
+        self.last_batch_size = 0
+        self.last_batch_ms = 0.0
+
+    # ---------- Public API ----------
+    def submit(self, text: str) -> Future:
+        """Queue one caption; the future resolves to its max toxic-label probability."""
+        self._ensure_worker()
+        fut: Future = Future()
+        self._queue.put((text or "", fut))
+        return fut
+
+    def score(self, text: str, timeout: float = 15.0) -> float:
+        return self.score_many([text], timeout)[0]
+
+    def score_many(self, texts: List[str], timeout: float = 15.0) -> List[float]:
+        # The model load gets its own (longer) budget; `timeout` covers inference only
+        self.ensure_loaded()
+        futs = [self.submit(t) for t in texts]
+        return [f.result(timeout=timeout) for f in futs]
+
+    def warmup(self) -> bool:
+        """Load the model and run one forward pass now (API startup). Returns False if it cannot load."""
+        try:
+            self.ensure_loaded()
+            self._forward(["warmup"])
+            print(f"✅ Local toxicity model ready: {self.model_name}")
+            return True
+        except Exception as e:
+            print(f"❌ Local toxicity model unavailable ({self.model_name}): {e}")
+            return False
+
+    def ensure_loaded(self) -> None:
+        """Load the model once; a failed load is remembered and re-raised instead of retried."""
+        if self._model is not None:
+            return
+        if self._load_error is not None:
+            raise RuntimeError(f"toxicity model failed to load: {self._load_error}")
+        if not self._load_lock.acquire(timeout=TOXICITY_LOAD_TIMEOUT):
+            raise TimeoutError("toxicity model is still loading")
+        try:
+            if self._model is None and self._load_error is None:
+                try:
+                    self._load()
+                except Exception as e:
+                    self._load_error = e
+            if self._load_error is not None:
+                raise RuntimeError(f"toxicity model failed to load: {self._load_error}")
+        finally:
+            self._load_lock.release()
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "loaded": self._model is not None,
+            "load_error": str(self._load_error) if self._load_error else None,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+            "avg_batch_ms": round(self.total_ms / self.batches, 2) if self.batches else 0,
+            "last_batch_size": self.last_batch_size,
+            "last_batch_ms": round(self.last_batch_ms, 2),
+        }
+
+    # ---------- Worker ----------
+    def _ensure_worker(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="toxicity-batcher", daemon=True)
+            self._thread.start()
+
+    def _load(self) -> None:
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        print(f"🔄 Loading local toxicity model: {self.model_name} (offline={self.offline})")
+        self._tokenizer = AutoTokenizer.from_pretrained(self.model_name, local_files_only=self.offline)
+        self._model = AutoModelForSequenceClassification.from_pretrained(
+            self.model_name, local_files_only=self.offline
+        )
+        self._model.eval()
+
+        cfg = self._model.config
+        labels = {int(i): str(l).lower() for i, l in (cfg.id2label or {}).items()}
+        self._multi_label = cfg.problem_type == "multi_label_classification" or (
+            cfg.problem_type is None and cfg.num_labels > 2
+        )
+        self._toxic_idx = [i for i, l in sorted(labels.items()) if l not in _NEUTRAL_LABELS]
+        if not self._toxic_idx:
+            self._toxic_idx = list(range(cfg.num_labels))
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            try:
+                self.ensure_loaded()
+                t0 = time.perf_counter()
+                scores = self._forward([text for text, _ in batch])
+                ms = (time.perf_counter() - t0) * 1000
+                self.batches += 1
+                self.items += len(batch)
+                self.total_ms += ms
+                self.last_batch_size, self.last_batch_ms = len(batch), ms
+                for (_, fut), s in zip(batch, scores):
+                    fut.set_result(s)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+
+    def _forward(self, texts: List[str]) -> List[float]:
+        import torch
+
+        enc = self._tokenizer(texts, padding=True, truncation=True, max_length=128, return_tensors="pt")
+        with torch.inference_mode():
+            logits = self._model(**enc).logits
+        probs = torch.sigmoid(logits) if self._multi_label else torch.softmax(logits, dim=-1)
+        return probs[:, self._toxic_idx].max(dim=-1).values.tolist()
+
+
+_scorer: Optional[LocalToxicityScorer] = None
+_scorer_lock = threading.Lock()
+
+
+def get_local_scorer() -> LocalToxicityScorer:
+    """Process-wide scorer so concurrent requests share one batcher."""
+    global _scorer
+    if _scorer is None:
+        with _scorer_lock:
+            if _scorer is None:
+                _scorer = LocalToxicityScorer()
+    return _scorer
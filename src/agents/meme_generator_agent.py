@@ -5,10 +5,24 @@ import re
 import textwrap, urllib.parse
 import urllib.request
 
-from src.utils.config import FONT_PATH, USE_PAID_API, OPENAI_API_KEY
-from src.utils.openai_client import openai_image
-from src.utils.telemetry import set_last_image_provider  # NEW
-import os, tempfile
+from src.utils.config import USE_PAID_API, OPENAI_API_KEY, ANIMATED_OUTPUT, AUTO_PLACE_CAPTIONS
+from src.utils.background_cache import background_cache
+from src.utils.animation import AnimOptions, is_animated, write_captioned_gif
+from src.utils.telemetry import set_last_image_provider, record_encode  # NEW
+from src.utils.image_cache import decode_reduced, get_template_image, template_cache
+from src.utils.fonts import get_font, get_emoji_font, MAIN_FONT_FILE, EMOJI_FONT_FILE
+from src.utils.text_measure import get_measurer
+from src.utils.emoji import emoji_atlas, split_runs_by_emoji as _split_runs_by_emoji
+from src.utils.text_layout import fit_text
+from src.utils.render_pool import RenderRejected, render_pool
+from src.utils.render_cache import render_cache, render_key, source_digest
+from src.utils.disk_store import atomic_write
+from src.utils.text_regions import place, template_regions
+from src.utils.output_spec import MEDIA_TYPES, OutputSpec, get_spec, thumbnail_specs, thumbnail_path, encode as _encode_spec
+import hashlib, time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import List, Optional, Tuple
 
 from io import BytesIO
 import os
@@ -21,106 +35,45 @@ def _encode(text: str) -> str:
 
 # ---------------- Emoji-aware text rendering helpers ----------------
 def _load_font(base_width: int, scale: float = 0.08):
-    size = max(12, int(base_width * scale))
-    candidates = [
-        FONT_PATH,
-        "src/data/fonts/impact.ttf",
-        "src/data/fonts/Impact.ttf",
-        "impact.ttf",
-        "Impact.ttf",
-        "arial.ttf",
-        "DejaVuSans.ttf",
-    ]
-    for path in candidates:
-        try:
-            return ImageFont.truetype(path, size)
-        except Exception:
-            continue
-    # As last resort
-    return ImageFont.load_default()
+    return get_font(max(12, int(base_width * scale)))
 
 
 def _load_emoji_font(base_width: int, scale: float = 0.08):
-    size = max(12, int(base_width * scale))
-    candidates = [
-        r"C:\\Windows\\Fonts\\seguiemj.ttf",
-        r"C:\\Windows\\Fonts\\seguisym.ttf",
-        "/usr/share/fonts/truetype/noto/NotoColorEmoji.ttf",
-        "/usr/share/fonts/truetype/noto/NotoEmoji-Regular.ttf",
-        "/System/Library/Fonts/Apple Color Emoji.ttc",
-        "src/data/fonts/NotoColorEmoji.ttf",
-        "src/data/fonts/NotoEmoji-Regular.ttf",
-    ]
-    for path in candidates:
-        try:
-            return ImageFont.truetype(path, size)
-        except Exception:
-            continue
-    return None
+    return get_emoji_font(max(12, int(base_width * scale)))
 
 
-_emoji_regex = re.compile("[\U0001F300-\U0001FAFF\U00002700-\U000027BF\U00002600-\U000026FF\U0001F1E6-\U0001F1FF]")
+# Outline thickness (px) around white caption text
+OUTLINE_WIDTH = 2
 
+def _tier(output: str = None) -> str:
+    """Background size tier for an output preset: capped outputs only need a preview-size image."""
+    return "preview" if get_spec(output).max_dim else "final"
 
-def _split_runs_by_emoji(text: str):
-    runs = []
-    if not text:
-        return runs
-    curr = []
-    curr_is_emoji = bool(_emoji_regex.match(text[0]))
-    for ch in text:
-        is_em = bool(_emoji_regex.match(ch))
-        if is_em != curr_is_emoji:
-            runs.append((curr_is_emoji, "".join(curr)))
-            curr = [ch]
-            curr_is_emoji = is_em
-        else:
-            curr.append(ch)
-    if curr:
-        runs.append((curr_is_emoji, "".join(curr)))
-    return runs
 
+# Part of every render cache key: bump when drawing or encoding output changes
+RENDERER_VERSION = "1"
 
 def _line_length_mixed(draw: ImageDraw.ImageDraw, text: str, font_main, font_emoji) -> int:
-    total = 0
-    runs = _split_runs_by_emoji(text)
-    for is_emoji, seg in runs:
-        f = (font_emoji or font_main) if is_emoji else font_main
-        total += int(draw.textlength(seg, font=f))
-    return total
+    return get_measurer(font_main, font_emoji).line_width(text)
 
 
 def _textlength_mixed(draw: ImageDraw.ImageDraw, text: str, font_main, font_emoji) -> int:
-    if not text:
-        return 0
-    lines = text.split("\n")
-    if len(lines) > 1:
-        return max(_line_length_mixed(draw, ln, font_main, font_emoji) for ln in lines)
-    return _line_length_mixed(draw, text, font_main, font_emoji)
-
-
-def _twemoji_filename_for(grapheme: str) -> str:
-    cps = '-'.join([format(ord(ch), 'x') for ch in grapheme])
-    return cps + '.png'
+    return get_measurer(font_main, font_emoji).text_width(text)
 
 
 def _try_paste_emoji(image, xy, text, font_main) -> int:
-    from pathlib import Path as _P
     x, y = xy
     size = getattr(font_main, 'size', 32)
-    p = _P('src/data/emoji') / _twemoji_filename_for(text)
-    if not p.exists():
-        return 0
-    try:
-        im = Image.open(str(p)).convert('RGBA').resize((size, size), Image.LANCZOS)
-        image.paste(im, (x, y - int(size*0.8)), im)
-        return size
-    except Exception:
+    im = emoji_atlas.sprite(text, size)
+    if im is None:
         return 0
+    image.paste(im, (x, y - int(size*0.8)), im)
+    return size
 
 
 def _draw_text_with_outline_mixed(image, draw, xy, text, font_main, font_emoji, align="left"):
     x, y = xy
+    measurer = get_measurer(font_main, font_emoji)
     runs = _split_runs_by_emoji(text)
     for is_emoji, seg in runs:
         f = (font_emoji or font_main) if is_emoji else font_main
@@ -130,13 +83,10 @@ def _draw_text_with_outline_mixed(image, draw, xy, text, font_main, font_emoji,
                 seg_w = pasted
                 x += seg_w
                 continue
-        seg_w = int(draw.textlength(seg, font=f))
-        for dx in (-2, -1, 0, 1, 2):
-            for dy in (-2, -1, 0, 1, 2):
-                if dx == 0 and dy == 0:
-                    continue
-                draw.text((x + dx, y + dy), seg, font=f, fill="black", align=align)
-        draw.text((x, y), seg, font=f, fill="white", align=align)
+        seg_w = int(measurer.word_width(seg))
+        # Single pass: FreeType strokes the glyph outline (replaces the 5x5 offset grid)
+        draw.text((x, y), seg, font=f, fill="white", align=align,
+                  stroke_width=OUTLINE_WIDTH, stroke_fill="black")
         x += seg_w
 
 
@@ -162,6 +112,52 @@ def _draw_multiline_with_outline_mixed(image, draw, xy, text, font_main, font_em
         _draw_text_with_outline_mixed(image, draw, (lx, y), ln, font_main, font_emoji, align=align)
         y += line_h + line_gap
 
+def _draw_fitted_block(image, draw, text: str, box, line_gap: int = 6, anchor_bottom: bool = False):
+    """Auto-fit `text` into box=(x, y, w, h, max_font) and draw it centered."""
+    bx, by, bw, bh, max_font = box
+    layout = fit_text(text, bw, bh, max_size=max_font, line_gap=line_gap, stroke=OUTLINE_WIDTH)
+    font = get_font(layout.font_size)
+    emoji_font = get_emoji_font(layout.font_size)
+    y = by + bh - layout.height if anchor_bottom else by
+    x = bx + (bw - layout.width) // 2
+    _draw_multiline_with_outline_mixed(image, draw, (x, y), "\n".join(layout.lines), font, emoji_font,
+                                       align="center", block_width=layout.width, line_gap=line_gap)
+    return layout
+
+
+def _caption_parts(caption: str) -> List[str]:
+    return [p.strip() for p in (caption or "").split("//")]
+
+
+def _draw_top_bottom_caption(image, caption: str, placement: Optional[list] = None) -> None:
+    """
+    Classic TOP // BOTTOM caption, each part auto-fitted into its band. With a
+    precomputed placement (one normalized (x, y, w, h) box per "//" part, see
+    src/utils/text_regions.py) each part is fitted into its box instead.
+    """
+    W, H = image.size
+    draw = ImageDraw.Draw(image)
+    parts = _caption_parts(caption)
+    max_font = max(12, int(W * 0.08))
+    if placement and len(placement) == len(parts):
+        for part, (x, y, w, h) in zip(parts, placement):
+            if part:
+                _draw_fitted_block(image, draw, part.upper(),
+                                   (int(x * W), int(y * H), max(1, int(w * W)), max(1, int(h * H)), max_font),
+                                   anchor_bottom=y + h / 2 > 0.5)
+        return
+    if len(parts) == 1:
+        parts = ["", parts[0]]
+
+    # Bands: 5% margin, 92% width, up to 22% of the height each; font capped at 8% of width
+    margin_x, band_w, band_h = int(W * 0.04), int(W * 0.92), int(H * 0.22)
+    if parts[0]:
+        _draw_fitted_block(image, draw, parts[0].upper(), (margin_x, int(H * 0.05), band_w, band_h, max_font))
+    if parts[1]:
+        _draw_fitted_block(image, draw, parts[1].upper(),
+                           (margin_x, H - int(H * 0.05) - band_h, band_w, band_h, max_font), anchor_bottom=True)
+
+
 def generate_with_memegen(template_id: str, top: str, bottom: str, out_path: str) -> str:
     url = f"https://api.memegen.link/images/{template_id}/{_encode(top)}/{_encode(bottom)}.png"
     r = requests.get(url, timeout=20)
@@ -176,73 +172,63 @@ def generate_with_memegen(template_id: str, top: str, bottom: str, out_path: str
 
 
 
-def generate_with_pillow(template_url: str, caption: str, out_path: str) -> str:
-    img = Image.open(requests.get(template_url, stream=True, timeout=20).raw).convert("RGB")
-    W, H = img.size
-    draw = ImageDraw.Draw(img)
-
-    # Robust truetype loading with fallbacks + emoji support
-    font = _load_font(W, 0.08)
-    emoji_font = _load_emoji_font(W, 0.08)
-
-    parts = [p.strip() for p in caption.split("//")]
-    if len(parts) == 1:
-        parts = ["", parts[0]]
-
-    if parts[0]:
-        t = textwrap.fill(parts[0].upper(), width=16)
-        tw = _textlength_mixed(draw, t, font, emoji_font)
-        _draw_multiline_with_outline_mixed(img, draw, ((W - tw) // 2, int(H * 0.05)), t, font, emoji_font, align="center", block_width=tw)
-
-    btxt = textwrap.fill(parts[1].upper(), width=16)
-    bw = _textlength_mixed(draw, btxt, font, emoji_font)
-    _draw_multiline_with_outline_mixed(img, draw, ((W - bw) // 2, H - int(H * 0.25)), btxt, font, emoji_font, align="center", block_width=bw)
-
-    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    img.save(out_path, "JPEG")
+def generate_with_pillow(template_url: str, caption: str, out_path: str, output: str = None) -> str:
+    out_path = _render_to_file({"kind": "caption", "template_url": template_url, "caption": caption}, out_path, output)
     set_last_image_provider("pillow")
     print("🖍️ Used Pillow overlay fallback")
     return out_path
 
 
-def overlay_text_on_local_image(image_path: str, caption: str, out_path: str) -> str:
-    img = Image.open(image_path).convert("RGB")
-    W, H = img.size
-    draw = ImageDraw.Draw(img)
-
+def overlay_text_on_local_image(image_path: str, caption: str, out_path: str, output: str = None) -> str:
     # Keep overlay consistent with Pillow renderer + emoji support
-    font = _load_font(W, 0.08)
-    emoji_font = _load_emoji_font(W, 0.08)
-
-    parts = [p.strip() for p in caption.split("//")]
-    if len(parts) == 1:
-        parts = ["", parts[0]]
-
-    if parts[0]:
-        t = textwrap.fill(parts[0].upper(), width=16)
-        tw = _textlength_mixed(draw, t, font, emoji_font)
-        _draw_text_with_outline_mixed(draw, ((W - tw) // 2, int(H * 0.05)), t, font, emoji_font, align="center")
+    out_path = _render_to_file({"kind": "caption", "template_path": image_path, "caption": caption}, out_path, output)
+    print("🖍️ Overlayed caption onto local image")
+    return out_path
 
-    btxt = textwrap.fill(parts[1].upper(), width=16)
-    bw = _textlength_mixed(draw, btxt, font, emoji_font)
-    _draw_text_with_outline_mixed(draw, ((W - bw) // 2, H - int(H * 0.25)), btxt, font, emoji_font, align="center")
 
-    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    img.save(out_path, "JPEG")
+def overlay_text_on_image_bytes(image_bytes: bytes, caption: str, out_path: str, output: str = None) -> str:
+    """Same as overlay_text_on_local_image for an in-memory (e.g. freshly generated) background."""
+    out_path = _render_to_file({"kind": "caption", "template_bytes": image_bytes, "caption": caption}, out_path, output)
     print("🖍️ Overlayed caption onto OpenAI background")
     return out_path
 
 
-def generate_meme(template: dict, caption: str, out_path: str) -> str:
-    top, bottom = ("", caption.strip())
-    if "//" in caption:
-        parts = [p.strip() for p in caption.split("//", 1)]
-        top, bottom = parts[0], parts[1]
+PLACEHOLDER_URL = "https://picsum.photos/1200/1200"  # a different random photo on every request
+
+
+def _placeholder_background() -> bytes:
+    """
+    A fresh random placeholder photo. Fetched directly, not through the
+    template cache: cached, the "random" URL would pin every fallback meme
+    to the first photo it returned.
+    """
+    r = requests.get(PLACEHOLDER_URL, timeout=20)
+    r.raise_for_status()
+    return r.content
+
+
+def generate_meme(template: dict, caption: str, out_path: str, output: str = None) -> str:
+    return generate_meme_bytes(template, caption, output, out_dir=str(Path(out_path).parent), persist=True).path
 
+
+def generate_meme_bytes(template: dict, caption: str, output: str = None,
+                        out_dir: str = "outputs", persist: bool = False) -> "RenderedMeme":
+    """
+    Render a caption meme in memory. Tries the template URL first, then an
+    OpenAI-generated background, then a random placeholder background.
+    With persist=True the result is also written to out_dir (rendered.path).
+    """
     # Prefer drawing directly on the provided template URL (bigger, local font)
     if template.get("url"):
         try:
-            return generate_with_pillow(template["url"], caption, out_path)
+            kind = "animated" if ANIMATED_OUTPUT and _is_animated_url(template["url"]) else "caption"
+            rendered = render_meme_bytes({"kind": kind, "template_url": template["url"], "caption": caption},
+                                         output, out_dir, persist)
+            set_last_image_provider("pillow")
+            return rendered
+        except RenderRejected:
+            # A saturated pool is not a broken template: no paid fallback, no second queueing
+            raise
         except Exception:
             pass
 
@@ -259,21 +245,27 @@ def generate_meme(template: dict, caption: str, out_path: str) -> str:
             )
             # ^ Notice: we do NOT put the actual caption into the prompt.
             print("🖼️ Using OpenAI image generation (background-only)")
-            tmp_bg = os.path.join(tempfile.gettempdir(), "meme_bg_openai.png")
-            path_bg = openai_image(prompt, out_path=tmp_bg)
+            bg = background_cache.get(prompt, _tier(output))
             set_last_image_provider("openai")
             # Now overlay the caption locally
-            return overlay_text_on_local_image(path_bg, caption, out_path)
+            return render_meme_bytes({"kind": "caption", "template_bytes": bg, "caption": caption},
+                                     output, out_dir, persist)
+        except RenderRejected:
+            raise
         except Exception as e:
             msg = str(e)
             print("⚠️ OpenAI image generation failed, falling back:", msg)
 
     # Do not use Memegen as a late fallback
 
-    return generate_with_pillow(template.get("url", ""), caption, out_path)
+    source = {"template_url": template["url"]} if template.get("url") else {"template_bytes": _placeholder_background()}
+    rendered = render_meme_bytes(dict(source, kind="caption", caption=caption), output, out_dir, persist)
+    set_last_image_provider("pillow")
+    print("🖍️ Used Pillow overlay fallback")
+    return rendered
 
 
-def generate_from_prompt_and_caption(image_prompt: str, caption: str, out_path: str) -> str:
+def generate_from_prompt_and_caption(image_prompt: str, caption: str, out_path: str, output: str = None) -> str:
     """
     Uses OpenAI Images to create a safe background from image_prompt,
     then overlays 'caption' locally. Falls back to Memegen/Pillow if needed.
@@ -281,21 +273,95 @@ def generate_from_prompt_and_caption(image_prompt: str, caption: str, out_path:
     if USE_PAID_API and OPENAI_API_KEY:
         try:
             print("🖼️ Using OpenAI image generation (planner prompt)")
-            tmp_bg = os.path.join(tempfile.gettempdir(), "meme_bg_openai.png")
-            path_bg = openai_image(image_prompt, out_path=tmp_bg)
+            bg = background_cache.get(image_prompt, _tier(output))
             set_last_image_provider("openai")
-            return overlay_text_on_local_image(path_bg, caption, out_path)
+            return overlay_text_on_image_bytes(bg, caption, out_path, output)
+        except RenderRejected:
+            raise
         except Exception as e:
             print("⚠️ OpenAI image generation failed, falling back:", e)
 
-    # Fall back to plain Pillow if OpenAI fails and no template is provided here.
-    return generate_with_pillow("https://picsum.photos/1200/1200", caption, out_path)
+    # Fall back to plain Pillow on a random placeholder if OpenAI fails (no template here)
+    out_path = _render_to_file({"kind": "caption", "template_bytes": _placeholder_background(), "caption": caption},
+                               out_path, output)
+    set_last_image_provider("pillow")
+    print("🖍️ Used Pillow overlay fallback")
+    return out_path
+
 
-def _impact_font(size: int):
+def generate_batch_from_prompt(image_prompt: str, captions: List[str], out_dir: str = "outputs",
+                               output: str = None) -> List[str]:
+    """
+    One background for many captions: the OpenAI image is generated and
+    decoded once, then every caption is drawn onto its own copy in parallel
+    on the render pool. Returns one output path per caption, in order.
+    """
+    if not captions:
+        return []
+    bg = None
+    if USE_PAID_API and OPENAI_API_KEY:
+        try:
+            print(f"🖼️ Using OpenAI image generation (planner prompt, {len(captions)} captions)")
+            bg = background_cache.get(image_prompt, _tier(output))
+            set_last_image_provider("openai")
+        except Exception as e:
+            print("⚠️ OpenAI image generation failed, falling back:", e)
+    if bg is None:
+        bg = _placeholder_background()
+        set_last_image_provider("pillow")
+
+    base = decode_reduced(bg, get_spec(output).max_dim)
+    return _render_captions_on(base, hashlib.sha256(bg).hexdigest(), captions, out_dir, output)
+
+
+def render_many(template: dict, captions: List[str], out_dir: str = "outputs", output: str = None) -> List[str]:
+    """
+    Render several captions on one template: fetched and decoded once, each
+    caption drawn on a copy in parallel on the render pool, one distinct
+    (content-addressed) output per caption, in order. Animated templates give
+    one captioned GIF per caption, as /generate does for a single caption.
+    """
+    if not captions:
+        return []
     try:
-        return ImageFont.truetype(FONT_PATH, size)
-    except Exception:
-        return ImageFont.load_default()
+        if ANIMATED_OUTPUT and _is_animated_url(template["url"]):
+            return _render_animated_many(template["url"], captions, out_dir, output)
+        digest = template_cache.digest(template["url"])
+        base = get_template_image(template["url"], get_spec(output).max_dim)
+    except RenderRejected:
+        raise
+    except Exception as e:
+        # No usable template image: per-caption fallbacks (OpenAI background / placeholder)
+        print("⚠️ Template fetch failed, rendering captions one by one:", e)
+        with ThreadPoolExecutor(max_workers=min(len(captions), max(1, render_pool.workers))) as ex:
+            return list(ex.map(lambda c: generate_meme_bytes(template, c, output, out_dir, persist=True).path, captions))
+    set_last_image_provider("pillow")
+    return _render_captions_on(base, digest, captions, out_dir, output)
+
+
+def _render_animated_many(url: str, captions: List[str], out_dir: str, output: str = None) -> List[str]:
+    """One animated job per caption; the frames are streamed in the worker, so there is no shared decode."""
+    def _one(caption: str) -> str:
+        job = {"kind": "animated", "template_url": url, "caption": caption}
+        return render_meme_bytes(job, output, out_dir, persist=True).path
+
+    set_last_image_provider("pillow")
+    with ThreadPoolExecutor(max_workers=min(len(captions), max(1, render_pool.workers))) as ex:
+        return list(ex.map(_one, captions))
+
+
+def _render_captions_on(base, digest: str, captions: List[str], out_dir: str, output: str = None) -> List[str]:
+    """Draw each caption on a copy of an already decoded base image (identified by `digest`)."""
+    shared = {"kind": "caption", "template_raw": (base.mode, base.size, base.tobytes()), "template_digest": digest}
+
+    def _one(caption: str) -> str:
+        return render_meme_bytes(dict(shared, caption=caption), output, out_dir, persist=True).path
+
+    with ThreadPoolExecutor(max_workers=min(len(captions), max(1, render_pool.workers))) as ex:
+        return list(ex.map(_one, captions))
+
+def _impact_font(size: int):
+    return get_font(size)
 
 def _draw_text_box(draw, W, H, box, font):
     text = (box.get("text") or "").strip()
@@ -306,20 +372,8 @@ def _draw_text_box(draw, W, H, box, font):
 
     max_width_px = max(16, int((box.get("width", 0.8) or 0.8) * W))
     align = box.get("align", "center")
-    # wrap
-    words = text.split()
-    lines = []
-    line = ""
-    for w in words:
-        test = (line + " " + w).strip()
-        if draw.textlength(test, font=font) <= max_width_px:
-            line = test
-        else:
-            if line:
-                lines.append(line)
-            line = w
-    if line:
-        lines.append(line)
+    # wrap (cached word advances, incremental line widths)
+    lines = get_measurer(font).wrap(text, max_width_px)
     block = "\n".join(lines)
 
     bbox = draw.multiline_textbbox((0, 0), block, font=font, align=align)
@@ -334,82 +388,274 @@ def _draw_text_box(draw, W, H, box, font):
     elif align == "right":
         x = int(x + (max_width_px - bw))
 
-    # outline + fill
-    def draw_with_outline(xy):
-        ox, oy = xy
-        for dx in (-2, -1, 0, 1, 2):
-            for dy in (-2, -1, 0, 1, 2):
-                if dx == 0 and dy == 0:
-                    continue
-                draw.multiline_text((ox+dx, oy+dy), block, font=font, fill="black", align=align, spacing=4)
-        draw.multiline_text((ox, oy), block, font=font, fill="white", align=align, spacing=4)
+    # outline + fill in one pass; Pillow adds 2*stroke_width to the line pitch,
+    # so take it back out of `spacing` to keep the old 4px gap
+    draw.multiline_text((x, y), block, font=font, fill="white", align=align,
+                        spacing=max(0, 4 - 2 * OUTLINE_WIDTH),
+                        stroke_width=OUTLINE_WIDTH, stroke_fill="black")
 
-    draw_with_outline((x, y))
-
-# Path for local font
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
 import requests
 
-font_path = "src/data/fonts/impact.ttf"
+def _layout_box(box: dict, width: int, height: int):
+    """Font pair and placed lines [(line, x, y)] for one editor text box on a width x height image."""
+    text = box["text"].upper() if box.get("uppercase", True) else box["text"]
+    font_scale = box.get("font_scale", 0.06)
+    box_width = int(width * box["width"])
+    x = int(box["x"] * width)
+    y = int(box["y"] * height)
+    align = box.get("align", "center")
+
+    if box.get("height"):
+        # Auto-fit: largest font whose wrapped lines fit the box width and height
+        layout = fit_text(text, box_width, int(box["height"] * height), stroke=OUTLINE_WIDTH)
+        font_size, lines, line_spacing = layout.font_size, layout.lines, layout.line_height
+    else:
+        # Estimate font size from the box's font_scale
+        font_size = max(int(width * font_scale), 12)
+        lines, line_spacing = None, font_size + 6
+    font = get_font(font_size)
+    emoji_font = get_emoji_font(font_size)
+
+    # Wrap text to fit inside box width
+    measurer = get_measurer(font, emoji_font)
+    if lines is None:
+        lines = measurer.wrap(text, box_width)
+
+    placed = []
+    for i, line in enumerate(lines):
+        text_width = measurer.line_width(line)
+        line_x = x
+        if align == "center":
+            line_x = x + (box_width - text_width) // 2
+        elif align == "right":
+            line_x = x + (box_width - text_width)
+        placed.append((line, line_x, y + i * line_spacing))
+    return font, emoji_font, placed
+
 
-def render_layout_on_template(template: dict, boxes: list, out_path: str) -> str:
-    # Load the template image from URL
-    image_url = template["url"]
-    response = requests.get(image_url)
-    image = Image.open(BytesIO(response.content)).convert("RGB")
+def _draw_layout_box(image, draw, box: dict, width: int, height: int, origin=(0, 0)) -> None:
+    """Draw one box laid out for a width x height image, shifted by -origin (for per-box layers)."""
+    font, emoji_font, placed = _layout_box(box, width, height)
+    ox, oy = origin
+    align = box.get("align", "center")
+    # Draw each line with alignment and stroke (emoji aware)
+    for line, line_x, line_y in placed:
+        _draw_text_with_outline_mixed(image, draw, (line_x - ox, line_y - oy), line, font, emoji_font, align=align)
+
+
+def _draw_layout_boxes(image, boxes: list) -> None:
     draw = ImageDraw.Draw(image)
     width, height = image.size
 
     # Render each text box
     for box in boxes:
-        text = box["text"].upper() if box.get("uppercase", True) else box["text"]
-        font_scale = box.get("font_scale", 0.06)
-        box_width = int(width * box["width"])
-        x = int(box["x"] * width)
-        y = int(box["y"] * height)
-        align = box.get("align", "center")
-
-        # Estimate font size
-        font_size = max(int(width * font_scale), 12)
-        font = ImageFont.truetype(font_path, font_size)
-        emoji_font = _load_emoji_font(width, font_scale)
-
-        # Wrap text to fit inside box width
-        def wrap_text(text, font, max_width):
-            words = text.split()
-            lines = []
-            line = ""
-            for word in words:
-                test_line = f"{line} {word}".strip()
-                text_width = draw.textbbox((0, 0), test_line, font=font)[2]
-                if text_width <= max_width:
-                    line = test_line
-                else:
-                    lines.append(line)
-                    line = word
-            if line:
-                lines.append(line)
-            return lines
-
-        lines = wrap_text(text, font, box_width)
-
-        # Draw each line with alignment and stroke (emoji aware)
-        line_spacing = font_size + 6
-        for i, line in enumerate(lines):
-            text_width = _textlength_mixed(draw, line, font, emoji_font)
-            line_x = x
-            if align == "center":
-                line_x = x + (box_width - text_width) // 2
-            elif align == "right":
-                line_x = x + (box_width - text_width)
-
-            line_y = y + i * line_spacing
-            _draw_text_with_outline_mixed(image, draw, (line_x, line_y), line, font, emoji_font, align=align)
-
-    # Save and return
-    image.save(out_path)
-    return out_path
+        _draw_layout_box(image, draw, box, width, height)
+
+
+def render_layout_on_template(template: dict, boxes: list, out_path: str, output: str = None) -> str:
+    return _render_to_file({"kind": "layout", "template_url": template["url"], "boxes": boxes}, out_path, output)
+
+
+def render_layout_bytes(template: dict, boxes: list, output: str = None,
+                        out_dir: str = "outputs", persist: bool = False) -> "RenderedMeme":
+    return render_meme_bytes({"kind": "layout", "template_url": template["url"], "boxes": boxes},
+                             output, out_dir, persist)
+
+
+# ---------------- Render jobs (executed in the render pool workers) ----------------
+def _load_job_image(job: dict):
+    # Outputs capped at max_dim (preview tier) are decoded at reduced resolution;
+    # caption fonts are sized from the image width, so they scale with it
+    max_dim = (job.get("output") or {}).get("max_dim")
+    if job.get("template_raw") is not None:
+        # Already decoded by the caller (shared across a batch): (mode, size, pixels)
+        mode, size, pixels = job["template_raw"]
+        return Image.frombytes(mode, tuple(size), pixels)
+    if job.get("template_bytes") is not None:
+        return decode_reduced(job["template_bytes"], max_dim)
+    if job.get("template_path"):
+        with open(job["template_path"], "rb") as f:
+            return decode_reduced(f.read(), max_dim)
+    return get_template_image(job["template_url"], max_dim)
+
+
+def _encode_image(img, spec: OutputSpec):
+    """(bytes, encode ms) for one output spec."""
+    t0 = time.perf_counter()
+    data = _encode_spec(img, spec)
+    return data, (time.perf_counter() - t0) * 1000
+
+
+_animated_digests = {}  # template digest -> is animated
+
+
+def _is_animated_url(url: str) -> bool:
+    digest, data = template_cache.get_bytes(url)
+    hit = _animated_digests.get(digest)
+    if hit is None:
+        if len(_animated_digests) >= 4096:
+            _animated_digests.clear()
+        hit = _animated_digests[digest] = is_animated(data)
+    return hit
+
+
+def _render_animated_job(job: dict) -> dict:
+    """Caption every frame of an animated template (streamed, see src/utils/animation.py) into a GIF."""
+    t0 = time.perf_counter()
+    if job.get("template_bytes") is not None:
+        data = job["template_bytes"]
+    elif job.get("template_path"):
+        with open(job["template_path"], "rb") as f:
+            data = f.read()
+    else:
+        data = template_cache.get_bytes(job["template_url"])[1]
+    opts = AnimOptions(**(job.get("anim") or {}))
+    max_dim = (job.get("output") or {}).get("max_dim")
+    if max_dim:
+        opts = replace(opts, max_dim=min(opts.max_dim, max_dim))
+
+    caption = job.get("caption") or ""
+    out = BytesIO()
+    with Image.open(BytesIO(data)) as src:
+        stats = write_captioned_gif(src, lambda layer: _draw_top_bottom_caption(layer, caption, job.get("placement")),
+                                    out, opts)
+    total_ms = (time.perf_counter() - t0) * 1000
+    return {"data": out.getvalue(), "thumbnails": [], "frames": stats["frames"],
+            "decode_ms": 0.0, "render_ms": 0.0, "encode_ms": total_ms}
+
+
+def render_job(job: dict) -> dict:
+    """
+    Decode + draw + encode one meme. `job` is a plain dict so it can cross the
+    process boundary: kind ("caption" | "layout" | "animated"), one of
+    template_bytes / template_path / template_url, caption or boxes, the output
+    spec and any thumbnail specs (all encoded from the same rendered image).
+    """
+    if job.get("kind") == "animated":
+        return _render_animated_job(job)
+    t0 = time.perf_counter()
+    img = _load_job_image(job)
+    t1 = time.perf_counter()
+    if job.get("kind") == "layout":
+        _draw_layout_boxes(img, job.get("boxes") or [])
+    else:
+        _draw_top_bottom_caption(img, job.get("caption") or "", job.get("placement"))
+    t2 = time.perf_counter()
+    data, encode_ms = _encode_image(img, OutputSpec.from_dict(job.get("output")))
+    thumbs = []
+    for d in job.get("thumbnails") or []:
+        t_data, t_ms = _encode_image(img, OutputSpec.from_dict(d))
+        thumbs.append({"data": t_data, "encode_ms": t_ms})
+    return {
+        "data": data,
+        "thumbnails": thumbs,
+        "decode_ms": (t1 - t0) * 1000,
+        "render_ms": (t2 - t1) * 1000,
+        "encode_ms": encode_ms,
+    }
+
+
+def _write_output(out_path: str, data: bytes) -> None:
+    """Write via temp file + rename so concurrent renders never leave a torn file."""
+    atomic_write(out_path, data)
+
+
+def _render_style() -> dict:
+    return {"version": RENDERER_VERSION, "outline": OUTLINE_WIDTH,
+            "font": Path(MAIN_FONT_FILE or "").name, "emoji_font": Path(EMOJI_FONT_FILE or "").name}
+
+
+@dataclass
+class RenderedMeme:
+    """
+    An encoded render; `path` is set once it exists in outputs/. Fresh renders
+    hold their bytes; cache hits only know the path and read the file the
+    first time `data` is asked for, so path-only callers never load it.
+    """
+    _data: Optional[bytes]
+    spec: OutputSpec
+    key: str
+    thumbnails: List[Tuple[OutputSpec, bytes]] = field(default_factory=list)
+    path: Optional[str] = None
+
+    @property
+    def data(self) -> bytes:
+        if self._data is None:
+            self._data = Path(self.path).read_bytes()
+        return self._data
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES.get(self.spec.format, "application/octet-stream")
+
+
+def _with_placement(job: dict) -> dict:
+    """Attach the precomputed caption boxes for the job's template, if the regions file has them."""
+    if not AUTO_PLACE_CAPTIONS or job.get("kind") not in ("caption", "animated"):
+        return job
+    # Resolved once here; render_key reuses it instead of hashing the source again
+    job = dict(job, template_digest=source_digest(job))
+    boxes = place(template_regions.get(job["template_digest"]), len(_caption_parts(job.get("caption"))))
+    return dict(job, placement=[list(b) for b in boxes]) if boxes else job
+
+
+def render_meme_bytes(job: dict, output: str = None, out_dir: str = "outputs",
+                      persist: bool = False) -> RenderedMeme:
+    """
+    Render `job` with the named output preset and return the encoded bytes.
+
+    Renders are keyed by the render cache key (template digest, caption/boxes,
+    style, encoder spec, renderer version): when out_dir already holds that
+    render it is returned by path instead of re-rendered (its bytes are read
+    only if `.data` is used). With persist=True a fresh render is also
+    written to out_dir.
+    """
+    spec = get_spec(output)
+    thumbs = thumbnail_specs(spec)
+    if job.get("kind") == "animated":
+        # Animated templates always come out as GIF; no still thumbnails
+        spec, thumbs = replace(spec, format="GIF", name=f"{spec.name}_gif"), []
+        job = dict(job, anim=AnimOptions().to_dict())
+    job = dict(_with_placement(job), output=spec.to_dict(), thumbnails=[t.to_dict() for t in thumbs])
+    key = render_key(job, style=_render_style())
+    path = render_cache.path_for(out_dir, key, spec.ext)
+
+    with render_cache.claim(key):
+        hit = render_cache.lookup(path)
+        if hit:
+            return RenderedMeme(None, spec, key, path=hit)
+        render_cache.misses += 1
+        res = render_pool.run(render_job, job)
+        rendered = RenderedMeme(res["data"], spec, key,
+                                [(t_spec, t_res["data"]) for t_spec, t_res in zip(thumbs, res["thumbnails"])])
+        record_encode(spec.name, spec.format, len(res["data"]), res["encode_ms"])
+        for t_spec, t_res in zip(thumbs, res["thumbnails"]):
+            record_encode(t_spec.name, t_spec.format, len(t_res["data"]), t_res["encode_ms"])
+        if persist:
+            save_render(rendered, out_dir)
+    return rendered
+
+
+def save_render(rendered: RenderedMeme, out_dir: str = "outputs") -> str:
+    """
+    Write a render (thumbnails first, then the main file, so its presence
+    implies theirs) under its cache name. Safe to call from a background task.
+    """
+    path = render_cache.path_for(out_dir, rendered.key, rendered.spec.ext)
+    if not path.exists():
+        for t_spec, data in rendered.thumbnails:
+            _write_output(thumbnail_path(str(path), t_spec), data)
+        _write_output(str(path), rendered.data)
+        render_cache.stored(out_dir)
+    rendered.path = str(path)
+    return rendered.path
+
+
+def _render_to_file(job: dict, out_path: str, output: str = None) -> str:
+    """Render into out_path's directory; the file name is the render cache key, not out_path's."""
+    return render_meme_bytes(job, output, str(Path(out_path).parent), persist=True).path
 
 
 def draw_text_on_image(image_path, top_text, bottom_text):
@@ -1,13 +1,27 @@
-import os, requests, re, csv, datetime
+import os, requests, datetime, unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from typing import List
 
 from src.utils.config import (
     COMPLIANCE_LOG,
+    COMPLIANCE_LOG_BATCH,
+    COMPLIANCE_LOG_FLUSH_SECS,
+    COMPLIANCE_LOG_MAX_BYTES,
+    COMPLIANCE_LOG_ROTATE_DAILY,
     BANNED_WORDS_FILE,
     PERSPECTIVE_API_KEY,
     HUGGINGFACE_API_TOKEN,
+    COMPLIANCE_CACHE_SIZE,
+    COMPLIANCE_CACHE_TTL,
+    TOXICITY_BACKEND,
+    TOXICITY_FAIL_CLOSED,
 )
-from src.utils.openai_client import openai_moderate
+from src.utils.openai_client import openai_moderate_many
+from src.utils.cache import TTLCache
+from src.utils.audit_log import AuditLogWriter
+from src.utils.banned_matcher import BannedTermMatcher
+from src.agents.local_toxicity import get_local_scorer
 
 
 # ---------------------------------------------------------
@@ -26,13 +40,36 @@ def _load_banned_words():
     """Load banned words from file or fallback to default list."""
     try:
         with open(BANNED_WORDS_FILE, "r", encoding="utf-8") as f:
-            return [w.strip().lower() for w in f if w.strip()]
+            return [w.strip().lower() for w in f if w.strip() and not w.startswith("#")]
     except Exception:
         # Default fallback list
         return ["kill", "suicide", "hate", "racist", "nazi", "terrorist", "bomb", "rape"]
 
 
 BANNED = set(_load_banned_words())
+BANNED_MATCHER = BannedTermMatcher(BANNED)
+
+
+def _policy_version() -> str:
+    """Cheap fingerprint of BANNED_WORDS_FILE (mtime + size); changes on edit."""
+    try:
+        st = os.stat(BANNED_WORDS_FILE)
+        return f"{st.st_mtime_ns}:{st.st_size}"
+    except OSError:
+        return "default"
+
+
+def _normalize_caption(caption: str) -> str:
+    """Cache key form of a caption: NFKC, case-folded, whitespace collapsed."""
+    text = unicodedata.normalize("NFKC", caption or "")
+    return " ".join(text.casefold().split())
+
+
+# Details returned when a remote check could not run and passed by default
+_FAIL_OPEN = {"openai_error", "hf_skip", "hf_error", "local_error", "perspective_err", "perspective_error"}
+
+# Details of blocks caused by an unusable check rather than the caption; never cached
+_FAIL_CLOSED = {"local_unavailable"}
 
 
 # ---------------------------------------------------------
@@ -43,64 +80,115 @@ class SecurityComplianceAgent:
     Multi-check compliance pipeline:
       1️⃣  OpenAI Moderation API (omni-moderation-latest)
       2️⃣  Local banned-word list
-      3️⃣  Hugging Face Toxic-BERT (unitary/toxic-bert)
+      3️⃣  Hugging Face Toxic-BERT (unitary/toxic-bert), remote API or local CPU model
       4️⃣  Google Perspective API (optional)
-    Logs all checks to /logs/compliance_logs.csv
+    Logs all checks to /logs/compliance_logs.<pid>.csv (buffered, background writer)
+
+    Verdicts are cached per (normalized caption, policy version), so repeated
+    checks of the same text skip the remote APIs until the TTL expires or
+    BANNED_WORDS_FILE changes.
     """
 
     def __init__(self, log_path=COMPLIANCE_LOG):
         self.log_path = log_path
+        self._audit = AuditLogWriter(
+            log_path,
+            max_batch=COMPLIANCE_LOG_BATCH,
+            flush_interval=COMPLIANCE_LOG_FLUSH_SECS,
+            max_bytes=COMPLIANCE_LOG_MAX_BYTES,
+            rotate_daily=COMPLIANCE_LOG_ROTATE_DAILY,
+        )
+        self._cache = TTLCache(maxsize=COMPLIANCE_CACHE_SIZE, ttl=COMPLIANCE_CACHE_TTL)
+        self._policy = _policy_version()
+
+    # ---------- Policy reload ----------
+    def _refresh_policy(self) -> str:
+        """Reload banned words and drop cached verdicts when the policy file changed."""
+        global BANNED, BANNED_MATCHER
+        version = _policy_version()
+        if version != self._policy:
+            BANNED = set(_load_banned_words())
+            BANNED_MATCHER = BannedTermMatcher(BANNED)
+            self._cache.clear()
+            self._policy = version
+            print("🔄 Compliance policy reloaded:", BANNED_WORDS_FILE)
+        return version
 
     # ---------- Logging ----------
     def _log(self, caption, status, detail):
-        """Write compliance result to CSV log."""
-        COMPLIANCE_LOG.parent.mkdir(parents=True, exist_ok=True)
-        with open(self.log_path, "a", newline="", encoding="utf-8") as f:
-            csv.writer(f).writerow(
-                [datetime.datetime.utcnow().isoformat(), status, caption, detail]
-            )
+        """Queue compliance result for the CSV audit log (flushed in the background)."""
+        self._audit.write([datetime.datetime.utcnow().isoformat(), status, caption, detail])
 
     # ---------- 1️⃣ OpenAI Moderation ----------
-    def _check_openai_moderation(self, caption: str):
-        """Check caption using the OpenAI moderation API via openai_client."""
+    def _check_openai_moderation_many(self, captions: List[str]):
+        """Check captions with one OpenAI moderation request (list input)."""
         try:
-            ok, detail = openai_moderate(caption)
-            if not ok:
-                return False, f"openai_flagged ({detail})"
-            return True, "openai_ok"
+            out = []
+            for ok, detail in openai_moderate_many(captions):
+                if not ok:
+                    out.append((False, f"openai_flagged ({detail})"))
+                elif detail == "openai_error":
+                    out.append((True, "openai_error"))
+                else:
+                    out.append((True, "openai_ok"))
+            return out
         except Exception as e:
             print("⚠️ OpenAI moderation error:", e)
-            return True, "openai_error"
+            return [(True, "openai_error")] * len(captions)
 
     # ---------- 2️⃣ Local banned-words ----------
     def _check_banned(self, caption: str):
-        """Check caption for banned keywords locally."""
-        tokens = re.findall(r"[a-zA-Z']+", caption.lower())
-        hits = sorted({t for t in tokens if t in BANNED})
+        """Check caption for banned words/phrases locally (obfuscation-aware)."""
+        hits = BANNED_MATCHER.find(caption)
         if hits:
             return False, f"banned terms {hits}"
         return True, "ok"
 
     # ---------- 3️⃣ Hugging Face Toxic-BERT ----------
-    def _check_hf_detoxify(self, caption: str, threshold: float = 0.80):
-        """Check caption toxicity using Hugging Face model (unitary/toxic-bert)."""
+    def _check_hf_detoxify_many(self, captions: List[str], threshold: float = 0.80):
+        """Check caption toxicity using Hugging Face model (unitary/toxic-bert), one request per list."""
+        if TOXICITY_BACKEND == "local":
+            return self._check_local_toxicity_many(captions, threshold)
         try:
             url = "https://api-inference.huggingface.co/models/unitary/toxic-bert"
             headers = {"Content-Type": "application/json"}
             if HUGGINGFACE_API_TOKEN:
                 headers["Authorization"] = f"Bearer {HUGGINGFACE_API_TOKEN}"  # optional auth
-            r = requests.post(url, headers=headers, json={"inputs": caption}, timeout=15)
+            r = requests.post(url, headers=headers, json={"inputs": captions}, timeout=15)
             if not r.ok:
-                return True, "hf_skip"
+                return [(True, "hf_skip")] * len(captions)
 
             data = r.json()
-            scores = [cls.get("score", 0.0) for item in data for cls in item]
-            if scores and max(scores) > threshold:
-                return False, f"toxic score {max(scores):.2f}"
-            return True, "hf_ok"
+            if len(data) != len(captions):
+                return [(True, "hf_skip")] * len(captions)
+            out = []
+            for item in data:
+                scores = [cls.get("score", 0.0) for cls in item]
+                if scores and max(scores) > threshold:
+                    out.append((False, f"toxic score {max(scores):.2f}"))
+                else:
+                    out.append((True, "hf_ok"))
+            return out
         except Exception as e:
             print("⚠️ HF detoxify error:", e)
-            return True, "hf_error"
+            return [(True, "hf_error")] * len(captions)
+
+    def _check_local_toxicity_many(self, captions: List[str], threshold: float = 0.80):
+        """Score captions with the offline, micro-batched toxicity model."""
+        try:
+            out = []
+            for score in get_local_scorer().score_many(captions):
+                if score > threshold:
+                    out.append((False, f"toxic score {score:.2f}"))
+                else:
+                    out.append((True, "local_ok"))
+            return out
+        except Exception as e:
+            # The local model is the toxicity check in this mode: do not pass captions it never saw
+            print("⚠️ Local toxicity error:", e)
+            if TOXICITY_FAIL_CLOSED:
+                return [(False, "local_unavailable")] * len(captions)
+            return [(True, "local_error")] * len(captions)
 
     # ---------- 4️⃣ Google Perspective API ----------
     def _check_perspective(self, caption: str, threshold: float = 0.80):
@@ -141,34 +229,92 @@ class SecurityComplianceAgent:
             print("⚠️ Perspective API error:", e)
             return True, "perspective_error"
 
+    def _check_perspective_many(self, captions: List[str]):
+        """Perspective has no batch endpoint; fan the requests out concurrently."""
+        if not PERSPECTIVE_API_KEY:
+            return [(True, "perspective_skip")] * len(captions)
+        if len(captions) == 1:
+            return [self._check_perspective(captions[0])]
+        with ThreadPoolExecutor(max_workers=min(8, len(captions))) as ex:
+            return list(ex.map(self._check_perspective, captions))
+
     # ---------- MAIN COMPLIANCE CHECK ----------
     def check(self, caption: str) -> ComplianceResult:
-        """Run all security checks and return overall result."""
+        """Run all security checks and return overall result (cached)."""
+        return self.check_many([caption])[0]
 
-        # 1️⃣ OpenAI moderation
-        ok, detail = self._check_openai_moderation(caption)
-        if not ok:
-            self._log(caption, "BLOCKED", detail)
-            return ComplianceResult(False, f"Blocked: {detail}")
-
-        # 2️⃣ Local banned words
+    def check_local(self, caption: str) -> ComplianceResult:
+        """
+        Local banned-terms check only: no network, no cache, no audit entry.
+        For live previews; whatever gets saved still goes through check().
+        """
+        self._refresh_policy()
         ok, detail = self._check_banned(caption)
-        if not ok:
-            self._log(caption, "BLOCKED", detail)
-            return ComplianceResult(False, f"Blocked: {detail}")
-
-        # 3️⃣ Hugging Face toxicity
-        ok, detail = self._check_hf_detoxify(caption)
-        if not ok:
-            self._log(caption, "BLOCKED", detail)
-            return ComplianceResult(False, f"Blocked: {detail}")
-
-        # 4️⃣ Perspective API
-        ok, detail = self._check_perspective(caption)
-        if not ok:
-            self._log(caption, "BLOCKED", detail)
-            return ComplianceResult(False, f"Blocked: {detail}")
+        return ComplianceResult(True, "OK") if ok else ComplianceResult(False, f"Blocked: {detail}")
+
+    def check_many(self, captions: List[str]) -> List[ComplianceResult]:
+        """
+        Check a list of captions with one request per backend for the whole list.
+        Cached and duplicate captions are resolved without any network call.
+        """
+        policy = self._refresh_policy()
+        keys = [(_normalize_caption(c), policy) for c in captions]
+        verdicts = {}
+        pending = {}
+        for caption, key in zip(captions, keys):
+            if key in verdicts or key in pending:
+                continue
+            cached = self._cache.get(key)
+            if cached is not None:
+                verdicts[key] = cached
+            else:
+                pending[key] = caption
+
+        if pending:
+            fresh = self._run_checks_many(list(pending.values()))
+            for key, (result, status, detail, cacheable) in zip(pending, fresh):
+                verdicts[key] = (result, status, detail)
+                if cacheable:
+                    self._cache.set(key, (result, status, detail))
+
+        results = []
+        for caption, key in zip(captions, keys):
+            result, status, detail = verdicts[key]
+            if key in pending:
+                self._log(caption, status, detail)
+                pending.pop(key)
+            else:
+                self._log(caption, status, f"cache_hit: {detail}")
+            results.append(result)
+        return results
+
+    def _run_checks_many(self, captions: List[str]):
+        """
+        Run every backend in order over the captions still undecided.
+        Returns [(ComplianceResult, status, detail, cacheable)]; passes that relied
+        on a failed-open remote check are not cacheable so they get re-checked.
+        """
+        out = [None] * len(captions)
+        degraded = [False] * len(captions)
+        checks = [
+            self._check_openai_moderation_many,                      # 1️⃣ OpenAI moderation
+            lambda caps: [self._check_banned(c) for c in caps],      # 2️⃣ Local banned words
+            self._check_hf_detoxify_many,                            # 3️⃣ Hugging Face toxicity
+            self._check_perspective_many,                            # 4️⃣ Perspective API
+        ]
+        for fn in checks:
+            alive = [i for i, r in enumerate(out) if r is None]
+            if not alive:
+                break
+            for i, (ok, detail) in zip(alive, fn([captions[i] for i in alive])):
+                if not ok:
+                    out[i] = (ComplianceResult(False, f"Blocked: {detail}"), "BLOCKED", detail,
+                              detail not in _FAIL_CLOSED)
+                elif detail in _FAIL_OPEN:
+                    degraded[i] = True
 
         # ✅ Passed all checks
-        self._log(caption, "PASSED", "ok")
-        return ComplianceResult(True, "OK")
+        return [
+            r if r is not None else (ComplianceResult(True, "OK"), "PASSED", "ok", not degraded[i])
+            for i, r in enumerate(out)
+        ]
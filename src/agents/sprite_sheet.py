@@ -0,0 +1,155 @@
+"""
+sprite_sheet.py
+---------------
+One image for a whole result grid.
+
+The k templates of a retrieval result (optionally with their suggested
+captions drawn on) are fitted into square cells of one sheet, encoded once,
+and described by a JSON offset map (x, y, w, h of every image on the sheet).
+The client loads and decodes a single image instead of k remote templates
+and k previews.
+
+Sheets are named by the hash of the result (template URLs + captions, in
+order), the cell size, the encoder spec and the renderer style, and live in
+outputs/sprites/ next to their map, so a repeated search is a file read.
+On a miss the template images are fetched concurrently in the request
+thread (joining any prefetch already downloading them) and handed to one
+render pool job, which only decodes and draws; caption boxes come from the
+precomputed template regions, as for single renders.
+"""
+
+import hashlib
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from src.agents.meme_generator_agent import (
+    _caption_parts,
+    _draw_top_bottom_caption,
+    _encode_image,
+    _render_style,
+    _write_output,
+)
+from src.utils.config import AUTO_PLACE_CAPTIONS, SPRITE_CELL, SPRITE_COLS, SPRITE_FETCH_WORKERS, SPRITE_MAX_CELL
+from src.utils.image_cache import decode_reduced, template_cache
+from src.utils.output_spec import OutputSpec, fit_to, get_spec
+from src.utils.render_cache import RenderCache
+from src.utils.render_pool import render_pool
+from src.utils.telemetry import record_encode
+from src.utils.text_regions import place, template_regions
+
+SPRITE_BG = (17, 24, 39)  # empty cell / letterbox color (matches the frontend's card background)
+
+sprite_cache = RenderCache(prefix="sprite")
+
+
+# ---------- Render job (executed in the render pool workers) ----------
+def render_sprite_job(job: dict) -> dict:
+    """
+    Compose job["items"] ({"template_bytes", "caption", "placement"}) into a
+    grid of job["cell"]-px cells, job["cols"] per row. Returns the encoded
+    sheet and one [x, y, w, h] per item (None where there are no bytes or
+    they could not be decoded).
+    """
+    cell, cols, items = job["cell"], job["cols"], job["items"]
+    rows = max(1, math.ceil(len(items) / cols))
+    sheet = Image.new("RGB", (cols * cell, rows * cell), SPRITE_BG)
+    offsets: List[Optional[List[int]]] = []
+    for i, item in enumerate(items):
+        if item.get("template_bytes") is None:
+            offsets.append(None)
+            continue
+        try:
+            img = fit_to(decode_reduced(item["template_bytes"], cell), cell)
+            if item.get("caption"):
+                _draw_top_bottom_caption(img, item["caption"], item.get("placement"))
+        except Exception as e:
+            print(f"⚠️ Sprite cell skipped for {item.get('url')}: {e}")
+            offsets.append(None)
+            continue
+        x = (i % cols) * cell + (cell - img.width) // 2
+        y = (i // cols) * cell + (cell - img.height) // 2
+        sheet.paste(img, (x, y))
+        offsets.append([x, y, img.width, img.height])
+    data, encode_ms = _encode_image(sheet, OutputSpec.from_dict(job["output"]))
+    return {"data": data, "size": list(sheet.size), "offsets": offsets, "encode_ms": encode_ms}
+
+
+# ---------- Template fetch (request thread) ----------
+def _fetch_one(url: str) -> Optional[Tuple[str, bytes]]:
+    if not url:
+        return None
+    try:
+        return template_cache.get_bytes(url)
+    except Exception as e:
+        print(f"⚠️ Sprite cell skipped for {url}: {e}")
+        return None
+
+
+def _job_items(items: List[Dict]) -> List[Dict]:
+    """
+    Items with their template bytes and caption boxes attached. Downloads run
+    concurrently; a URL the prefetcher is already fetching is joined by the
+    template cache's single-flight rather than downloaded twice.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(len(items), SPRITE_FETCH_WORKERS))) as ex:
+        fetched = list(ex.map(_fetch_one, [item["url"] for item in items]))
+    out = []
+    for item, got in zip(items, fetched):
+        digest, data = got or (None, None)
+        boxes = None
+        if data is not None and item["caption"] and AUTO_PLACE_CAPTIONS:
+            boxes = place(template_regions.get(digest), len(_caption_parts(item["caption"])))
+        out.append(dict(item, template_bytes=data, placement=[list(b) for b in boxes] if boxes else None))
+    return out
+
+
+# ---------- Public API ----------
+def build_sprite_sheet(templates: List[Dict], cell: int = SPRITE_CELL, captioned: bool = False,
+                       output: str = "preview", out_dir: str = "outputs/sprites") -> dict:
+    """
+    Sprite sheet for a retrieval result: {"key", "sheet" (path), "width",
+    "height", "cell", "cols", "items": [{id, name, url, caption, x, y, w, h, ok}]}.
+    """
+    cell = max(32, min(int(cell or SPRITE_CELL), SPRITE_MAX_CELL))
+    cols = max(1, min(SPRITE_COLS, len(templates)))
+    # Cells are already fitted; the preset only chooses the encoder
+    spec = get_spec(output)
+    spec = replace(spec, max_dim=None, name=f"{spec.name}_sprite")
+    items = [{"url": t.get("url") or "", "caption": (t.get("caption") or "") if captioned else ""}
+             for t in templates]
+    job = {"items": items, "cell": cell, "cols": cols, "output": spec.to_dict()}
+    blob = json.dumps({"job": job, "style": _render_style(), "regions": template_regions.stamp()},
+                      sort_keys=True, ensure_ascii=False)
+    key = hashlib.sha256(blob.encode("utf-8")).hexdigest()
+    path = sprite_cache.path_for(out_dir, key, spec.ext)
+    map_path = path.with_suffix(".json")
+
+    with sprite_cache.claim(key):
+        if map_path.exists() and sprite_cache.lookup(path):
+            with open(map_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        sprite_cache.misses += 1
+        # The key is URL-based; the worker gets the bytes so it never downloads under its timeout
+        res = render_pool.run(render_sprite_job, dict(job, items=_job_items(items)))
+        record_encode(spec.name, spec.format, len(res["data"]), res["encode_ms"])
+
+        entries = []
+        for t, item, off in zip(templates, items, res["offsets"]):
+            entry = {"id": t.get("id"), "name": t.get("name"), "url": item["url"],
+                     "caption": item["caption"], "ok": off is not None}
+            entry.update(dict(zip("xywh", off or [0, 0, 0, 0])))
+            entries.append(entry)
+        sheet_map = {"key": key, "sheet": str(path), "width": res["size"][0], "height": res["size"][1],
+                     "cell": cell, "cols": cols, "media_type": spec.media_type, "items": entries}
+        _write_output(str(path), res["data"])
+        # The map is what makes a sheet a cache hit; sheets with missing cells are
+        # rebuilt next time, since a template that failed to load may load then
+        if all(e["ok"] for e in entries):
+            _write_output(str(map_path), json.dumps(sheet_map, ensure_ascii=False).encode("utf-8"))
+        sprite_cache.stored(out_dir)
+    return sheet_map
@@ -0,0 +1,90 @@
+"""
+bench_animated.py
+-----------------
+Animated caption benchmark on a long synthetic GIF: frames/sec and peak RSS
+of the streaming writer (caption layer rasterized once, two frames in memory)
+vs collecting every composited frame and calling Pillow's save_all, for each
+palette option. Each run happens in a fresh process so peak RSS is per run.
+
+Run from the project root:
+    python -m src.benchmarks.bench_animated [frames] [width] [height]
+"""
+
+import multiprocessing
+import resource
+import sys
+import time
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+from src.utils.animation import AnimOptions, caption_layer, iter_frames, write_captioned_gif
+
+CAPTION = "WHEN THE GIF HAS SIX HUNDRED FRAMES // AND YOU STILL HAVE RAM"
+
+
+def _make_gif(n: int, w: int, h: int) -> bytes:
+    def frames():
+        for i in range(n):
+            im = Image.new("RGB", (w, h), (40, 90, 160))
+            d = ImageDraw.Draw(im)
+            x = (i * 7) % w
+            d.ellipse((x, h // 3, x + h // 4, h // 3 + h // 4), fill="yellow")
+            d.rectangle((w - x, h // 2, w - x + 40, h // 2 + 40), fill=(20, 180, 60))
+            yield im
+    it = frames()
+    first = next(it)
+    buf = BytesIO()
+    first.save(buf, "GIF", save_all=True, append_images=it, duration=40, loop=0)
+    return buf.getvalue()
+
+
+def _draw(layer):
+    from src.agents.meme_generator_agent import _draw_top_bottom_caption
+    _draw_top_bottom_caption(layer, CAPTION)
+
+
+def _rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def _run(mode: str, palette: str, data: bytes, q) -> None:
+    import src.agents.meme_generator_agent  # noqa: F401  (font/atlas setup outside the measurement)
+    opts = AnimOptions(palette=palette, max_dim=10_000, max_frames=100_000)
+    before = _rss_mb()
+    t0 = time.perf_counter()
+    out = BytesIO()
+    with Image.open(BytesIO(data)) as src:
+        if mode == "stream":
+            frames = write_captioned_gif(src, _draw, out, opts)["frames"]
+        else:
+            composited, layer, offset = [], None, None
+            for rgba, _ in iter_frames(src, opts):
+                if layer is None:
+                    layer, offset = caption_layer(rgba.size, _draw)
+                rgba.alpha_composite(layer, dest=offset)
+                composited.append(rgba.convert("RGB"))
+            composited[0].save(out, "GIF", save_all=True, append_images=composited[1:], duration=40, loop=0)
+            frames = len(composited)
+    secs = time.perf_counter() - t0
+    q.put((frames, secs, before, _rss_mb(), len(out.getvalue())))
+
+
+def main(n: int = 600, w: int = 480, h: int = 270) -> None:
+    data = _make_gif(n, w, h)
+    print(f"Source: {n} frames, {w}x{h}, {len(data) / 1e6:.1f} MB\n")
+    print(f"{'mode':<10}{'palette':<10}{'frames/s':>10}{'base RSS MB':>13}{'peak RSS MB':>13}{'out MB':>9}")
+    ctx = multiprocessing.get_context("spawn")
+    runs = [("stream", "adaptive"), ("stream", "global"), ("stream", "web"), ("save_all", "adaptive")]
+    for mode, palette in runs:
+        q = ctx.Queue()
+        p = ctx.Process(target=_run, args=(mode, palette, data, q))
+        p.start()
+        frames, secs, base, peak, size = q.get()
+        p.join()
+        print(f"{mode:<10}{palette if mode == 'stream' else '-':<10}{frames / secs:>10.1f}"
+              f"{base:>13.1f}{peak:>13.1f}{size / 1e6:>9.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:4]))
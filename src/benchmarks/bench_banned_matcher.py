@@ -0,0 +1,66 @@
+"""
+bench_banned_matcher.py
+-----------------------
+Benchmark for the Aho-Corasick banned-term matcher with large term lists.
+The obfuscation normalization is covered by tests/test_banned_matcher.py.
+
+Run from the project root:
+    python -m src.benchmarks.bench_banned_matcher
+"""
+
+import random
+import string
+import time
+
+from src.utils.banned_matcher import BannedTermMatcher
+
+
+def _random_terms(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+    terms = set()
+    while len(terms) < n:
+        words = ["".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(4, 9)))
+                 for _ in range(rnd.choice((1, 1, 1, 2, 3)))]
+        terms.add(" ".join(words))
+    return sorted(terms)
+
+
+def _caption(n_words: int, rnd: random.Random) -> str:
+    return " ".join("".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(2, 8)))
+                    for _ in range(n_words))
+
+
+def _naive_find(terms, caption: str):
+    lo = " " + " ".join(caption.lower().split()) + " "
+    return sorted(t for t in terms if f" {t} " in lo)
+
+
+def main():
+    rnd = random.Random(42)
+    captions = {n: [_caption(n, rnd) for _ in range(200)] for n in (8, 32, 128)}
+    print(f"{'terms':>7} {'build ms':>9} {'words':>6} {'matcher us':>11} {'naive us':>9}")
+    for n_terms in (1_000, 10_000, 50_000):
+        terms = _random_terms(n_terms)
+        t0 = time.perf_counter()
+        matcher = BannedTermMatcher(terms)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        for n_words, caps in captions.items():
+            # Plant a term in every other caption so both paths report hits
+            caps = [c + " " + terms[i % len(terms)] if i % 2 else c for i, c in enumerate(caps)]
+
+            t0 = time.perf_counter()
+            for c in caps:
+                matcher.find(c)
+            ac_us = (time.perf_counter() - t0) / len(caps) * 1e6
+
+            t0 = time.perf_counter()
+            for c in caps[:20]:
+                _naive_find(terms, c)
+            naive_us = (time.perf_counter() - t0) / 20 * 1e6
+
+            print(f"{n_terms:>7} {build_ms:>9.1f} {n_words:>6} {ac_us:>11.1f} {naive_us:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
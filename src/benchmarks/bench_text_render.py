@@ -0,0 +1,104 @@
+"""
+bench_text_render.py
+--------------------
+Caption rasterization micro-benchmark: legacy 5x5 offset-grid outline
+(25 draw calls per segment) vs the single-pass stroke renderer, per caption
+length, plus the visual parity between the two outputs: the run exits non-zero when
+they differ by more than the outline-corner tolerance (the same limits are
+asserted in tests/test_text_render.py).
+
+Run from the project root:
+    python -m src.benchmarks.bench_text_render
+"""
+
+import sys
+import textwrap
+import time
+
+from PIL import Image, ImageChops, ImageDraw, ImageStat
+
+from src.agents.meme_generator_agent import (
+    _draw_multiline_with_outline_mixed,
+    _load_font,
+    _textlength_mixed,
+)
+
+CAPTIONS = {
+    10: "SHIP IT NOW",
+    40: "WHEN THE TESTS PASS ON THE FIRST TRY WOW",
+    120: "ME EXPLAINING TO MY MANAGER WHY THE FIVE MINUTE FIX TOOK THREE DAYS AND TOUCHED "
+         "EVERY SINGLE FILE IN THE ENTIRE REPOSITORY OK",
+}
+
+# Parity tolerances (measured: mean diff <= 1.1, <= 0.9% of pixels off by more than 64)
+MAX_MEAN_DIFF = 2.0
+MAX_CHANGED_PCT = 1.5
+
+
+def _legacy_multiline(draw, xy, text, font, block_width, line_gap=6):
+    """The previous renderer: 24 black offset passes + 1 white pass per line."""
+    x, y = xy
+    ascent, descent = font.getmetrics()
+    for ln in text.split("\n"):
+        lw = int(draw.textlength(ln, font=font))
+        lx = x + (block_width - lw) // 2
+        for dx in (-2, -1, 0, 1, 2):
+            for dy in (-2, -1, 0, 1, 2):
+                if dx == 0 and dy == 0:
+                    continue
+                draw.text((lx + dx, y + dy), ln, font=font, fill="black")
+        draw.text((lx, y), ln, font=font, fill="white")
+        y += ascent + descent + line_gap
+
+
+def _render(caption: str, legacy: bool, size=(800, 800)):
+    img = Image.new("RGB", size, (120, 140, 160))
+    draw = ImageDraw.Draw(img)
+    font = _load_font(size[0], 0.08)
+    text = textwrap.fill(caption, width=16)
+    bw = _textlength_mixed(draw, text, font, None)
+    xy = ((size[0] - bw) // 2, 40)
+    if legacy:
+        _legacy_multiline(draw, xy, text, font, bw)
+    else:
+        _draw_multiline_with_outline_mixed(img, draw, xy, text, font, None, align="center", block_width=bw)
+    return img
+
+
+def parity(caption: str):
+    """(mean diff, % of pixels off by more than 64) between the legacy and stroke renders."""
+    # The stroke is a round dilation, the old grid a square one, so only
+    # outline corners should differ
+    diff = ImageChops.difference(_render(caption, True), _render(caption, False)).convert("L")
+    hist = diff.histogram()
+    return ImageStat.Stat(diff).mean[0], sum(hist[65:]) / (diff.width * diff.height) * 100
+
+
+def _time(fn, repeat: int = 30) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    failed = []
+    print(f"{'chars':>6} {'legacy ms':>10} {'stroke ms':>10} {'speedup':>8} {'mean diff':>10} {'px >64':>8}")
+    for n, caption in CAPTIONS.items():
+        legacy_ms = _time(lambda: _render(caption, legacy=True))
+        stroke_ms = _time(lambda: _render(caption, legacy=False))
+        mean, changed = parity(caption)
+        print(f"{n:>6} {legacy_ms:>10.2f} {stroke_ms:>10.2f} {legacy_ms / stroke_ms:>7.1f}x "
+              f"{mean:>10.3f} {changed:>7.2f}%")
+        if mean > MAX_MEAN_DIFF or changed > MAX_CHANGED_PCT:
+            failed.append(n)
+
+    if failed:
+        print(f"❌ Visual parity check failed for {failed}-char captions "
+              f"(limits: mean diff {MAX_MEAN_DIFF}, {MAX_CHANGED_PCT}% of pixels)")
+        sys.exit(1)
+    print("✅ Visual parity within tolerance")
+
+
+if __name__ == "__main__":
+    main()
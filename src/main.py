@@ -1,17 +1,28 @@
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path 
 from src.pipeline import MemePipeline
-from src.utils.config import USE_PAID_API, OPENAI_TEXT_MODEL
+from src.utils.config import USE_PAID_API, OPENAI_TEXT_MODEL, TOXICITY_BACKEND, EDITOR_IDLE_MS, PREFETCH_TOP_K
 from src.utils.telemetry import get_last_image_provider
-from src.utils.telemetry import set_last_image_provider
+from src.utils.telemetry import set_last_image_provider, get_encode_stats
+from src.utils.output_spec import PRESETS, get_spec, thumbnail_specs, thumbnail_path
 from src.utils.openai_client import openai_plan_search
 from src.agents.meme_idea_agent import plan_from_context as openai_plan_from_context
-from src.agents.meme_generator_agent import generate_from_prompt_and_caption, overlay_text_on_local_image
+from src.agents.meme_generator_agent import generate_batch_from_prompt, overlay_text_on_local_image, save_render
+from src.agents.local_toxicity import get_local_scorer
+from src.agents.editor_session import editor_sessions
+from src.agents.sprite_sheet import build_sprite_sheet, sprite_cache
+from src.utils.render_pool import render_pool
+from src.utils.render_cache import render_cache
+from src.utils.background_cache import background_cache
+from src.utils.text_regions import template_regions
+from src.utils.prefetch import template_prefetcher
+import asyncio
 
 # Ensure Grok client logs its startup config (mirrors OpenAI logs)
 try:
@@ -29,6 +40,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Inline renders carry their metadata in headers; browsers only expose listed ones
+    expose_headers=["X-Render-Key", "X-Model-Used", "X-Output-Path", "X-Edit-Ms", "X-Changed-Boxes"],
 )
 
 app.mount("/outputs", StaticFiles(directory="outputs"), name="outputs")
@@ -42,6 +55,7 @@ class TextBox(BaseModel):
     x: float
     y: float
     width: float
+    height: Optional[float] = None  # set to auto-fit the font size into width x height
     align: str = "center"
     font_scale: float = 0.06
     uppercase: bool = True
@@ -62,6 +76,7 @@ class GenerateResponse(BaseModel):
 class SmartGenerateResponse(BaseModel):
     path: str
     model_used: str
+    thumbnails: List[str] = []
 
 class ComplianceRequest(BaseModel):
     caption: str
@@ -92,9 +107,49 @@ class OverlayRequest(BaseModel):
 class SmartGenerateRequest(BaseModel):
     template: Optional[Dict] = None
     caption: Optional[str] = None
+    captions: Optional[List[str]] = None  # batch: several captions for one template
     boxes: Optional[List[TextBox]] = None
     context: Optional[str] = None
     safety_level: Optional[str] = "safe"
+    output: Optional[str] = None  # output preset: final | web | avif | preview | legacy
+    tier: Optional[str] = "final"  # "preview": reduced-resolution decode + render (preview preset)
+
+class EditorSessionRequest(BaseModel):
+    template: Dict
+    boxes: List[TextBox] = []
+    tier: Optional[str] = "preview"
+    safety_level: Optional[str] = "safe"
+
+class EditorBoxesRequest(BaseModel):
+    boxes: List[TextBox]
+    output: Optional[str] = "preview"
+    safety_level: Optional[str] = "safe"
+
+class SpriteRequest(BaseModel):
+    templates: List[Dict]           # a /templates result, in display order
+    size: int = 256                 # cell size (px) of each square cell
+    captioned: bool = False         # draw each template's suggested caption
+    safety_level: Optional[str] = "safe"
+    output: Optional[str] = "preview"
+
+def _output_for(req: SmartGenerateRequest) -> Optional[str]:
+    if req.output:
+        return req.output
+    return "preview" if (req.tier or "final").lower() == "preview" else None
+
+def _thumbnails_for(path: str, output: Optional[str]) -> List[str]:
+    thumbs = [thumbnail_path(path, t) for t in thumbnail_specs(get_spec(output))]
+    return [p for p in thumbs if Path(p).exists()]  # animated (GIF) renders have none
+
+def _inline_response(rendered, out_dir: Path, persist: bool, background_tasks: BackgroundTasks,
+                     model_used: str) -> Response:
+    """Stream an in-memory render; writing it to outputs/ (if asked) happens after the response."""
+    headers = {"X-Render-Key": rendered.key, "X-Model-Used": model_used}
+    if rendered.path:
+        headers["X-Output-Path"] = rendered.path
+    elif persist:
+        background_tasks.add_task(save_render, rendered, str(out_dir))
+    return Response(content=rendered.data, media_type=rendered.media_type, headers=headers)
 
 # Helper to route planning between OpenAI and Grok based on model name
 def _route_plan_from_context(context: str, model: str = "openai") -> Dict:
@@ -145,19 +200,28 @@ def get_templates(prompt: str = "", context: str = "", k: int = 6, safety_level:
 
     # Retrieve templates using IR agent
     templates = pipe.suggest_templates(query, k) if not context else pipe.retriever.retrieve(query, top_k=k, tags=tags)
+    # Warm the image cache while captions are suggested and the user picks one
+    template_prefetcher.schedule(t.get("url") for t in templates[:PREFETCH_TOP_K])
 
     results: List[Dict] = []
+    if model_used == "openai":
+        # Safe mode: moderate every suggested idea in one batched check, keep the first that passes
+        ideas_per_tpl = [pipe.auto_captions(query, t["name"]) for t in templates]  # OpenAI-heavy suggester
+        flat = [c for ideas in ideas_per_tpl for c in ideas]
+        verdicts = dict(zip(flat, pipe.compliance.check_many(flat)))
+        for t, ideas in zip(templates, ideas_per_tpl):
+            ok_ideas = [c for c in ideas if verdicts[c].ok]
+            cap = ok_ideas[0] if ok_ideas else f"{query} // make it meme"
+            results.append({**t, "caption": cap})
+        return results
+
     for t in templates:
-        if model_used == "openai":
-            ideas = pipe.auto_captions(query, t["name"])  # OpenAI-heavy suggester
-            cap = ideas[0] if ideas else f"{query} // make it meme"
-        else:
-            try:
-                plan2 = _route_plan_from_context(f"{t['name']} {query}", model=model_used)
-                caps2 = plan2.get("captions") or []
-                cap = str(caps2[0]) if caps2 else f"{query} // make it meme"
-            except Exception:
-                cap = f"{query} // make it meme"
+        try:
+            plan2 = _route_plan_from_context(f"{t['name']} {query}", model=model_used)
+            caps2 = plan2.get("captions") or []
+            cap = str(caps2[0]) if caps2 else f"{query} // make it meme"
+        except Exception:
+            cap = f"{query} // make it meme"
         results.append({**t, "caption": cap})
     return results
 
@@ -174,11 +238,13 @@ def get_ideas(prompt: str, template: str, safety_level: str = "safe"):
         return {"ideas": []}
 
 @app.post("/generate", response_model=SmartGenerateResponse)
-def smart_generate(req: SmartGenerateRequest):
+def smart_generate(req: SmartGenerateRequest, background_tasks: BackgroundTasks,
+                   inline: bool = False, persist: bool = True):
     try:
         out_dir = Path("outputs")
         out_dir.mkdir(parents=True, exist_ok=True)
         model_used = "openai" if (req.safety_level or "safe").lower() == "safe" else "grok"
+        template_prefetcher.note_use((req.template or {}).get("url"))
 
         # ✅ Safety-level validation
         VALID_SAFETY_LEVELS = {
@@ -210,14 +276,20 @@ def smart_generate(req: SmartGenerateRequest):
             else:
                 print("[compliance] bypassed for non-safe mode (layout)")
 
+            if inline:
+                from src.agents.meme_generator_agent import render_layout_bytes
+                rendered = render_layout_bytes(req.template, [b.dict() for b in req.boxes], _output_for(req), str(out_dir))
+                return _inline_response(rendered, out_dir, persist, background_tasks, model_used)
+
             from src.agents.meme_generator_agent import render_layout_on_template
             out_path = out_dir / f"meme_{req.template.get('id', 'tpl')}_layout.jpg"
             final_path = render_layout_on_template(
-                req.template, [b.dict() for b in req.boxes], str(out_path)
+                req.template, [b.dict() for b in req.boxes], str(out_path), _output_for(req)
             )
 
             # ✅ Auto-open in browser
-            return {"path": str(final_path), "model_used": model_used}
+            return {"path": str(final_path), "model_used": model_used,
+                    "thumbnails": _thumbnails_for(final_path, _output_for(req))}
 
         # ✅ Legacy single-caption meme generation
         if req.template and req.caption:
@@ -228,14 +300,24 @@ def smart_generate(req: SmartGenerateRequest):
             else:
                 print("[compliance] bypassed for non-safe mode (caption)")
 
+            if inline:
+                # Compliance already ran above
+                rendered = pipe.build_meme_bytes(req.template, req.caption, out_dir=str(out_dir),
+                                                 enforce_compliance=False, output=_output_for(req))
+                print(f"[generate] image_provider={get_last_image_provider()} planner_model={model_used} inline")
+                return _inline_response(rendered, out_dir, persist, background_tasks, model_used)
+
+            # Compliance already ran above
             path = pipe.build_meme(
                 req.template,
                 req.caption,
                 out_dir=str(out_dir),
-                enforce_compliance=((req.safety_level or "safe").lower() == "safe")
+                enforce_compliance=False,
+                output=_output_for(req)
             )
             print(f"[generate] image_provider={get_last_image_provider()} planner_model={model_used}")
-            return {"path": str(path), "model_used": model_used}
+            return {"path": str(path), "model_used": model_used,
+                    "thumbnails": _thumbnails_for(path, _output_for(req))}
 
         raise ValueError("Provide either {template + boxes[]} or {template + caption}.")
 
@@ -245,6 +327,199 @@ def smart_generate(req: SmartGenerateRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ---------- Editor sessions (decoded base + per-box layers kept between edits) ----------
+def _editor_blocked(boxes: List[Dict], safety_level: Optional[str], full: bool = False) -> Optional[str]:
+    """
+    Compliance reason when the joined box text is blocked in safe mode, else None.
+    Previews (every typed state) use the local banned-terms check only; the
+    full remote check (full=True) runs on the settled state that gets saved.
+    """
+    if (safety_level or "safe").lower() != "safe":
+        return None
+    joined = " ".join(b["text"] for b in boxes if b.get("text"))
+    if not joined:
+        return None
+    chk = pipe.compliance.check(joined) if full else pipe.compliance.check_local(joined)
+    return None if chk.ok else chk.reason
+
+@app.post("/editor/session")
+def editor_open(req: EditorSessionRequest):
+    boxes = [b.dict() for b in req.boxes]
+    reason = _editor_blocked(boxes, req.safety_level)
+    if reason:
+        raise HTTPException(status_code=400, detail=reason)
+    max_dim = get_spec("preview").max_dim if (req.tier or "preview").lower() == "preview" else None
+    template_prefetcher.note_use(req.template.get("url"))
+    sid, session = editor_sessions.create(req.template, max_dim)
+    session.set_boxes(boxes)
+    w, h = session.size
+    return {"session_id": sid, "width": w, "height": h}
+
+@app.post("/editor/session/{sid}/render")
+def editor_render(sid: str, req: EditorBoxesRequest):
+    session = editor_sessions.get(sid)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired editor session")
+    boxes = [b.dict() for b in req.boxes]
+    reason = _editor_blocked(boxes, req.safety_level)
+    if reason:
+        raise HTTPException(status_code=400, detail=reason)
+    changed = session.set_boxes(boxes)
+    data = session.encode(req.output)
+    headers = {"X-Edit-Ms": f"{session.last_edit_ms:.2f}", "X-Changed-Boxes": ",".join(map(str, changed))}
+    return Response(content=data, media_type=get_spec(req.output).media_type, headers=headers)
+
+@app.delete("/editor/session/{sid}")
+def editor_close(sid: str):
+    editor_sessions.close(sid)
+    return {"ok": True}
+
+
+def _apply_edit(boxes: List[Dict], msg: Dict) -> List[Dict]:
+    """Apply one live-editor message: full list ("boxes"), one box diff ("patch") or "remove"."""
+    kind = msg.get("type")
+    if kind == "boxes":
+        return [TextBox(**b).dict() for b in msg.get("boxes") or []]
+    if kind not in ("patch", "remove"):
+        raise ValueError(f"unknown edit type: {kind!r}")
+    i = msg.get("index")
+    # A patch may append (index == len); anything else must name an existing box
+    limit = len(boxes) + 1 if kind == "patch" else len(boxes)
+    if not isinstance(i, int) or isinstance(i, bool) or not 0 <= i < limit:
+        raise ValueError(f"index out of range: {i!r}")
+    if kind == "patch":
+        merged = TextBox(**{**(boxes[i] if i < len(boxes) else {}), **(msg.get("box") or {})}).dict()
+        return boxes[:i] + [merged] + boxes[i + 1:]
+    return boxes[:i] + boxes[i + 1:]
+
+def _final_render(template: Dict, boxes: List[Dict], safe: bool, output: Optional[str]):
+    """Full-quality render of a settled editor state: (path, bytes, media type)."""
+    reason = _editor_blocked(boxes, "safe" if safe else "no_filter", full=True)
+    if reason:
+        raise ValueError(reason)
+    from src.agents.meme_generator_agent import render_layout_on_template
+    path = render_layout_on_template(template, boxes, str(Path("outputs") / "meme_editor.jpg"), output)
+    return path, Path(path).read_bytes(), get_spec(output).media_type
+
+@app.websocket("/editor/ws")
+async def editor_live(ws: WebSocket):
+    """
+    Live editor preview. First message: {"template", "boxes", "safety_level", "output"}.
+    Then any number of {"type": "boxes" | "patch" | "remove", ...} edits. Only the
+    latest state is rendered (superseded states are dropped); each preview is a
+    {"type": "frame"} JSON header followed by the encoded bytes. After
+    EDITOR_IDLE_MS without edits the settled state is rendered at full quality
+    ({"type": "final", "path"} + bytes). Malformed edits and, in safe mode, states
+    whose text is blocked get a {"type": "error"} frame instead of a preview.
+    """
+    await ws.accept()
+    try:
+        hello = await ws.receive_json()
+        template = hello["template"]
+        safe = (hello.get("safety_level") or "safe").lower() == "safe"
+        output = hello.get("output")
+        sid, session = await run_in_threadpool(editor_sessions.create, template, get_spec("preview").max_dim)
+        state = {"boxes": _apply_edit([], {"type": "boxes", "boxes": hello.get("boxes")}), "version": 1}
+    except WebSocketDisconnect:
+        return
+    except Exception as e:
+        await ws.send_json({"type": "error", "reason": str(e)})
+        await ws.close()
+        return
+    dirty = asyncio.Event()
+    dirty.set()
+    w, h = session.size
+    await ws.send_json({"type": "ready", "session_id": sid, "width": w, "height": h})
+
+    async def receive():
+        while True:
+            msg = await ws.receive_json()
+            try:
+                state["boxes"] = _apply_edit(state["boxes"], msg)
+            except Exception as e:
+                await ws.send_json({"type": "error", "reason": f"bad edit: {e}"})
+                continue
+            state["version"] += 1
+            dirty.set()
+
+    async def render():
+        shown = finalized = dropped = 0
+        while True:
+            try:
+                await asyncio.wait_for(dirty.wait(), timeout=EDITOR_IDLE_MS / 1000)
+            except asyncio.TimeoutError:
+                if shown and finalized != shown:
+                    finalized = shown
+                    try:
+                        path, data, media_type = await run_in_threadpool(
+                            _final_render, template, list(state["boxes"]), safe, output)
+                    except Exception as e:
+                        await ws.send_json({"type": "error", "version": shown, "reason": str(e)})
+                        continue
+                    await ws.send_json({"type": "final", "version": shown, "path": path, "media_type": media_type})
+                    await ws.send_bytes(data)
+                continue
+            dirty.clear()
+            version, boxes = state["version"], state["boxes"]
+            dropped += max(0, version - shown - 1)
+            # Local check only, so frames never wait on remote moderation
+            reason = _editor_blocked(boxes, "safe" if safe else "no_filter")
+            if reason:
+                await ws.send_json({"type": "error", "version": version, "reason": reason})
+                continue
+            await run_in_threadpool(session.set_boxes, boxes)
+            data = await run_in_threadpool(session.encode, "preview")
+            await ws.send_json({"type": "frame", "version": version, "dropped": dropped,
+                                "edit_ms": round(session.last_edit_ms, 2),
+                                "media_type": get_spec("preview").media_type})
+            await ws.send_bytes(data)
+            shown = version
+
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(render())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for t in tasks:
+            t.cancel()
+        editor_sessions.close(sid)
+
+
+# ---------- Sprite sheets (whole result grid in one image) ----------
+@app.post("/sprites")
+def sprite_sheet(req: SpriteRequest):
+    """
+    One image with every template (or captioned preview) of a result, plus a
+    map of where each one is: {"sheet": "outputs/sprites/...", "items": [{x, y, w, h, ...}]}.
+    """
+    if not req.templates:
+        raise HTTPException(status_code=400, detail="No templates given")
+    templates = [dict(t) for t in req.templates]
+    if req.captioned and (req.safety_level or "safe").lower() == "safe":
+        caps = [t.get("caption") or "" for t in templates]
+        for t, res in zip(templates, pipe.compliance.check_many(caps)):
+            if not res.ok:
+                t["caption"] = ""  # blocked captions: show the bare template
+    try:
+        return build_sprite_sheet(templates, req.size, req.captioned, req.output or "preview")
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.on_event("startup")
+def _warm_local_toxicity():
+    # Load the local model before the first request instead of during it
+    if TOXICITY_BACKEND == "local":
+        get_local_scorer().warmup()
+
+
+@app.on_event("shutdown")
+def _shutdown_render_pool():
+    template_prefetcher.shutdown()
+    render_pool.shutdown()
+
+
 @app.post("/check", response_model=ComplianceResponse)
 def check_caption(req: ComplianceRequest):
     res = pipe.check_caption(req.caption)
@@ -256,6 +531,17 @@ def status():
         "mode": "paid" if USE_PAID_API else "free",
         "openai_model": OPENAI_TEXT_MODEL,
         "last_image_provider": get_last_image_provider(),
+        "toxicity_backend": TOXICITY_BACKEND,
+        "toxicity_batches": get_local_scorer().stats() if TOXICITY_BACKEND == "local" else None,
+        "render_pool": render_pool.stats(),
+        "render_cache": render_cache.stats(),
+        "sprite_cache": sprite_cache.stats(),
+        "background_cache": background_cache.stats,
+        "template_regions": template_regions.stats(),
+        "prefetch": template_prefetcher.info(),
+        "editor_sessions": editor_sessions.stats(),
+        "output_presets": {name: spec.to_dict() for name, spec in PRESETS.items()},
+        "encoders": get_encode_stats(),
         "supported_safety_levels": ["safe", "no_filter", "sarcastic", "political", "racist", "dark_humor", "offensive"]
     }
 
@@ -271,41 +557,35 @@ def generate_batch(req: SmartGenerateRequest):
     out_dir = Path("outputs"); out_dir.mkdir(parents=True, exist_ok=True)
     items: List[Dict] = []
 
-    if req.context and not (req.template and req.caption):
+    if req.context and not (req.template and (req.captions or req.caption)):
         model_used = "openai" if (req.safety_level or "safe").lower() == "safe" else "grok"
         print(f"[batch] using={model_used.upper()} context={req.context}")
         plan = _route_plan_from_context(req.context, model=model_used)
         caps = (plan["captions"] or [])[:6]
         if not caps:
             caps = ["WHEN REALITY HITS", "POV: MONDAY"]
-        for i, cap in enumerate(caps, 1):
-            if (req.safety_level or "safe").lower() == "safe":
-                chk = pipe.compliance.check(cap)
-                if not chk.ok:
-                    continue
-            else:
-                print("[compliance] bypassed for non-safe mode (batch/context)")
-            out_path = str(out_dir / f"meme_{i}.jpg")
-            path = generate_from_prompt_and_caption(plan["image_prompt"], cap, out_path)
-            items.append({"path": path, "caption": cap})
+        if (req.safety_level or "safe").lower() == "safe":
+            verdicts = pipe.compliance.check_many(caps)
+            caps = [c for c, chk in zip(caps, verdicts) if chk.ok]
+        else:
+            print("[compliance] bypassed for non-safe mode (batch/context)")
+        # One background for all captions, overlays rendered in parallel
+        paths = generate_batch_from_prompt(plan["image_prompt"], caps, str(out_dir), _output_for(req))
+        items = [{"path": path, "caption": cap} for path, cap in zip(paths, caps)]
         return {"items": items}
 
-    if req.template and req.caption:
-        for i, cap in enumerate(req.caption[:6], 1):
-            if (req.safety_level or "safe").lower() == "safe":
-                chk = pipe.compliance.check(cap)
-                if not chk.ok:
-                    continue
-            else:
-                print("[compliance] bypassed for non-safe mode (batch/template)")
-            out_path = str(out_dir / f"meme_{i}.jpg")
-            path = pipe.build_meme(
-                req.template,
-                cap,
-                out_dir=str(out_dir),
-                enforce_compliance=((req.safety_level or "safe").lower() == "safe")
-            )
-            items.append({"path": path, "caption": cap})
+    if req.template and (req.captions or req.caption):
+        caps = (req.captions or [req.caption])[:6]
+        if (req.safety_level or "safe").lower() == "safe":
+            verdicts = pipe.compliance.check_many(caps)
+            caps = [c for c, chk in zip(caps, verdicts) if chk.ok]
+        else:
+            print("[compliance] bypassed for non-safe mode (batch/template)")
+
+        # Template fetched/decoded once, captions rendered in parallel (compliance ran above)
+        paths = pipe.build_many(req.template, caps, out_dir=str(out_dir),
+                                enforce_compliance=False, output=_output_for(req))
+        items = [{"path": path, "caption": cap} for path, cap in zip(paths, caps)]
         return {"items": items}
 
     raise ValueError("Provide either {context} or {template + caption}.")
@@ -9,6 +9,8 @@ from src.utils.config import USE_PAID_API, OPENAI_TEXT_MODEL
 
 from src.agents.meme_generator_agent import (
     generate_meme,            
+    generate_meme_bytes,
+    render_many,
     render_layout_on_template 
 )
 
@@ -43,7 +45,8 @@ class MemePipeline:
     # ---------------------------
     # Meme Generator Agent
     # ---------------------------
-    def build_meme(self, template: Dict[str, Any], caption: str, out_dir: str = "outputs", enforce_compliance: bool = True) -> str:
+    def build_meme(self, template: Dict[str, Any], caption: str, out_dir: str = "outputs", enforce_compliance: bool = True,
+                   output: Optional[str] = None) -> str:
         """Generate meme image with given caption, after compliance check."""
         if enforce_compliance:
             chk = self.compliance.check(caption)
@@ -52,7 +55,25 @@ class MemePipeline:
 
         Path(out_dir).mkdir(parents=True, exist_ok=True)
         out_path = Path(out_dir) / f"meme_{template.get('id', 'tpl')}.jpg"
-        return generate_meme(template, caption, str(out_path))
+        return generate_meme(template, caption, str(out_path), output)
+
+    def build_many(self, template: Dict[str, Any], captions: List[str], out_dir: str = "outputs",
+                   enforce_compliance: bool = True, output: Optional[str] = None) -> List[str]:
+        """Several captions on one template (decoded once); captions failing compliance are dropped."""
+        if enforce_compliance:
+            verdicts = self.compliance.check_many(captions)
+            captions = [c for c, chk in zip(captions, verdicts) if chk.ok]
+        Path(out_dir).mkdir(parents=True, exist_ok=True)
+        return render_many(template, captions, out_dir, output)
+
+    def build_meme_bytes(self, template: Dict[str, Any], caption: str, out_dir: str = "outputs",
+                         enforce_compliance: bool = True, output: Optional[str] = None):
+        """Like build_meme, but returns the encoded image in memory (RenderedMeme) without writing it."""
+        if enforce_compliance:
+            chk = self.compliance.check(caption)
+            if not chk.ok:
+                raise ValueError(chk.reason)
+        return generate_meme_bytes(template, caption, output, out_dir=out_dir)
 
     # ---------------------------
     # Security & Compliance Agent
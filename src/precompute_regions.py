@@ -0,0 +1,129 @@
+"""
+precompute_regions.py
+---------------------
+Offline pass over the template catalog: panel splits and text-safe regions
+for every template image (see src/utils/text_regions.py), written next to the
+catalog as data/template_regions.json. The renderer reads that file to place
+captions automatically, so no image analysis happens at request time.
+
+Entries are keyed by image digest, so re-running only analyses new or changed
+images (use --force after changing the analysis without bumping its version).
+
+Run from the project root:
+    python -m src.precompute_regions [--sources catalog,imgflip,memegen] [--limit N] [--workers N] [--force]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.config import SRC_DIR, TEMPLATE_CATALOG_FILE, TEMPLATE_REGIONS_FILE
+from src.utils.disk_store import atomic_write
+from src.utils.image_cache import decode_reduced, template_cache
+from src.utils.text_regions import ANALYSIS_DIM, REGIONS_VERSION, analyze
+
+
+# ---------- Catalog sources ----------
+def _catalog() -> List[dict]:
+    """Local catalog entries (data/templates.json): a remote `url` or a local `image_path`."""
+    try:
+        with open(TEMPLATE_CATALOG_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print("⚠️ Could not read template catalog:", e)
+        return []
+
+
+def _remote(source: str) -> List[dict]:
+    from src.agents.template_retrieval_agent import TemplateRetrievalAgent
+    fetch = getattr(TemplateRetrievalAgent(), f"fetch_{source}")
+    return [{"id": t.id, "name": t.name, "url": t.url, "source": t.source} for t in fetch()]
+
+
+def _load(entry: dict) -> Tuple[str, bytes]:
+    """(digest, bytes) of a catalog entry's image."""
+    if entry.get("url"):
+        return template_cache.get_bytes(entry["url"])
+    path = entry["image_path"]
+    for base in ("", SRC_DIR.parent):
+        candidate = os.path.join(base, path) if base else path
+        if os.path.exists(candidate):
+            with open(candidate, "rb") as f:
+                data = f.read()
+            return hashlib.sha256(data).hexdigest(), data
+    raise FileNotFoundError(path)
+
+
+# ---------- Regions file ----------
+def _read_regions() -> Dict[str, dict]:
+    try:
+        with open(TEMPLATE_REGIONS_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return {"templates": data.get("templates") or {}, "urls": data.get("urls") or {}}
+    except Exception:
+        return {"templates": {}, "urls": {}}
+
+
+def _write_regions(data: Dict[str, dict]) -> None:
+    blob = json.dumps({"version": REGIONS_VERSION, **data}, indent=1, sort_keys=True, ensure_ascii=False)
+    atomic_write(TEMPLATE_REGIONS_FILE, blob.encode("utf-8"))
+
+
+def _analyze_entry(entry: dict, known: Dict[str, dict], force: bool) -> Optional[Tuple[str, dict]]:
+    try:
+        digest, data = _load(entry)
+    except Exception as e:
+        print(f"⚠️ Skipping {entry.get('id')}: {e}")
+        return None
+    rec = known.get(digest)
+    if force or not rec or rec.get("version") != REGIONS_VERSION:
+        rec = analyze(decode_reduced(data, ANALYSIS_DIM))
+    rec = dict(rec, id=entry.get("id"), name=entry.get("name"))
+    return digest, rec
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Precompute text-safe regions for the template catalog.")
+    ap.add_argument("--sources", default="catalog,imgflip,memegen",
+                    help="comma list of: catalog, imgflip, memegen")
+    ap.add_argument("--limit", type=int, default=0, help="max templates per source (0 = all)")
+    ap.add_argument("--workers", type=int, default=8, help="parallel downloads/analyses")
+    ap.add_argument("--force", action="store_true", help="re-analyse images already in the file")
+    args = ap.parse_args()
+
+    entries: List[dict] = []
+    for source in [s.strip() for s in args.sources.split(",") if s.strip()]:
+        try:
+            found = _catalog() if source == "catalog" else _remote(source)
+        except Exception as e:
+            print(f"⚠️ Skipping source {source}: {e}")
+            continue
+        entries += found[:args.limit] if args.limit else found
+    print(f"🗂️ {len(entries)} templates from {args.sources}")
+
+    data = _read_regions()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
+        results = list(ex.map(lambda e: _analyze_entry(e, data["templates"], args.force), entries))
+
+    multi = 0
+    for entry, res in zip(entries, results):
+        if res is None:
+            continue
+        digest, rec = res
+        data["templates"][digest] = rec
+        if entry.get("url"):
+            data["urls"][entry["url"]] = digest
+        multi += len(rec["panels"]) > 1
+    _write_regions(data)
+    done = sum(r is not None for r in results)
+    print(f"✅ {done}/{len(entries)} templates ({multi} multi-panel) in {time.perf_counter() - t0:.1f}s "
+          f"→ {TEMPLATE_REGIONS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+animation.py
+------------
+Captioning animated templates (GIF, APNG, animated WebP) into animated GIFs.
+
+The caption is rasterized once into an RGBA layer (cropped to its ink) and
+alpha-composited onto every frame. Frames are decoded, composited, quantized
+and written one at a time through Pillow's GIF frame writer, so memory stays
+at roughly two frames (current and previous, for writing only the changed
+region) regardless of the animation length; Pillow's own save_all keeps
+every frame until the end.
+"""
+
+from dataclasses import asdict, dataclass
+from io import BytesIO
+from typing import IO, Callable, Iterator, Optional, Tuple
+
+from PIL import GifImagePlugin, Image, ImageChops, ImageSequence
+
+from src.utils.config import ANIM_COLORS, ANIM_DITHER, ANIM_MAX_DIM, ANIM_MAX_FRAMES, ANIM_PALETTE
+
+
+@dataclass(frozen=True)
+class AnimOptions:
+    max_frames: int = ANIM_MAX_FRAMES
+    max_dim: int = ANIM_MAX_DIM
+    palette: str = ANIM_PALETTE     # adaptive: per-frame palette | global: first frame's | web: fixed 216 colors
+    colors: int = ANIM_COLORS
+    dither: bool = ANIM_DITHER
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def is_animated(data: bytes) -> bool:
+    try:
+        with Image.open(BytesIO(data)) as im:
+            return bool(getattr(im, "is_animated", False))
+    except Exception:
+        return False
+
+
+def _target_size(size: Tuple[int, int], max_dim: int) -> Tuple[int, int]:
+    w, h = size
+    if not max_dim or max(w, h) <= max_dim:
+        return w, h
+    r = max_dim / max(w, h)
+    return max(1, int(w * r)), max(1, int(h * r))
+
+
+def iter_frames(im: Image.Image, opts: AnimOptions) -> Iterator[Tuple[Image.Image, int]]:
+    """(RGBA frame, duration ms), decoded lazily and capped at opts.max_frames / opts.max_dim."""
+    size = _target_size(im.size, opts.max_dim)
+    for i, frame in enumerate(ImageSequence.Iterator(im)):
+        if i >= opts.max_frames:
+            break
+        rgba = frame.convert("RGBA")
+        if rgba.size != size:
+            rgba = rgba.resize(size, Image.BILINEAR)
+        yield rgba, int(frame.info.get("duration") or im.info.get("duration") or 100)
+
+
+def caption_layer(size: Tuple[int, int], draw: Callable[[Image.Image], None]):
+    """Rasterize a caption once: (RGBA layer cropped to its ink, (x, y) offset) or (None, None)."""
+    canvas = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw(canvas)
+    bbox = canvas.getbbox()
+    if bbox is None:
+        return None, None
+    return canvas.crop(bbox), bbox[:2]
+
+
+def _quantize(rgb: Image.Image, opts: AnimOptions, palette: Optional[Image.Image]) -> Image.Image:
+    dither = Image.Dither.FLOYDSTEINBERG if opts.dither else Image.Dither.NONE
+    if palette is not None:
+        return rgb.quantize(palette=palette, dither=dither)
+    if opts.palette == "web":
+        return rgb.convert("P", palette=Image.Palette.WEB, dither=dither)
+    return rgb.quantize(colors=opts.colors, method=Image.Quantize.MEDIANCUT, dither=dither)
+
+
+def write_captioned_gif(src: Image.Image, draw: Callable[[Image.Image], None], fp: IO[bytes],
+                        opts: AnimOptions = AnimOptions()) -> dict:
+    """Stream `src` with the caption drawn by `draw` composited on every frame into `fp` as a GIF."""
+    layer = offset = palette = prev = None
+    frames = 0
+    for rgba, duration in iter_frames(src, opts):
+        if frames == 0:
+            layer, offset = caption_layer(rgba.size, draw)
+        if layer is not None:
+            rgba.alpha_composite(layer, dest=offset)
+        rgb = rgba.convert("RGB")
+
+        if frames == 0:
+            q, box = _quantize(rgb, opts, None), (0, 0) + rgb.size
+            # getheader may reorder the palette in place; later frames map onto the result
+            header, _ = GifImagePlugin.getheader(q, None, {"loop": src.info.get("loop", 0)})
+            for chunk in header:
+                fp.write(chunk)
+            if opts.palette in ("global", "web"):
+                palette = q
+        else:
+            # Only the region that changed since the previous frame is written (disposal 1 keeps the rest)
+            box = ImageChops.difference(prev, rgb).getbbox() or (0, 0, 1, 1)
+            q = _quantize(rgb.crop(box), opts, palette)
+        for chunk in GifImagePlugin.getdata(q, box[:2], duration=duration, disposal=1,
+                                            include_color_table=palette is None):
+            fp.write(chunk)
+        prev = rgb
+        frames += 1
+    fp.write(b";")  # GIF trailer
+    return {"frames": frames, "size": list(_target_size(src.size, opts.max_dim))}
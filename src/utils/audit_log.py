@@ -0,0 +1,136 @@
+"""
+audit_log.py
+------------
+Non-blocking, buffered CSV audit log.
+
+Rows are queued from the request path and written in batches by a background
+thread, flushed when the batch fills up or after `flush_interval` seconds.
+Each process writes its own file (`<stem>.<pid>.csv`), so multiple workers
+never interleave rows. Files rotate by size and/or day, and pending rows are
+flushed on interpreter shutdown.
+"""
+
+import atexit
+import csv
+import datetime
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+
+class AuditLogWriter:
+    def __init__(self, base_path, max_batch: int = 100, flush_interval: float = 2.0,
+                 max_bytes: int = 10 * 1024 * 1024, rotate_daily: bool = True,
+                 max_queue: int = 10000):
+        self.base_path = Path(base_path)
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = max(0.05, flush_interval)
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._pid: Optional[int] = None
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._day: Optional[datetime.date] = None
+        atexit.register(self.close)
+
+    # ---------- Request path ----------
+    def write(self, row: List) -> None:
+        """Queue one row; never blocks (rows are dropped if the queue is full)."""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush pending rows and stop the writer thread."""
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            self._stop.set()
+            self._thread.join(timeout)
+
+    @property
+    def path(self) -> Path:
+        """Active file for this process."""
+        return self.base_path.with_name(f"{self.base_path.stem}.{os.getpid()}{self.base_path.suffix}")
+
+    # ---------- Writer thread ----------
+    def _ensure_worker(self) -> None:
+        pid = os.getpid()
+        if self._pid == pid and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != pid:
+                # Fresh state after fork: the parent's queue and thread do not carry over
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._stop = threading.Event()
+                self._thread = None
+                self._pid = pid
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="audit-log", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        batch: List[List] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            stopping = self._stop.is_set()
+            if len(batch) >= self.max_batch or now >= deadline or stopping:
+                if stopping:
+                    batch.extend(self._drain())
+                if batch:
+                    self._flush(batch)
+                    batch = []
+                deadline = now + self.flush_interval
+            if stopping:
+                return
+
+    def _drain(self) -> List[List]:
+        rows = []
+        while True:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                return rows
+
+    def _flush(self, rows: List[List]) -> None:
+        try:
+            path = self.path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._maybe_rotate(path)
+            with open(path, "a", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerows(rows)
+        except Exception as e:
+            print("⚠️ Audit log write failed:", e)
+
+    def _maybe_rotate(self, path: Path) -> None:
+        today = datetime.date.today()
+        if not path.exists():
+            self._day = today
+            return
+        if self._day is None:
+            self._day = datetime.date.fromtimestamp(path.stat().st_mtime)
+        too_big = self.max_bytes and path.stat().st_size >= self.max_bytes
+        new_day = self.rotate_daily and self._day != today
+        if too_big or new_day:
+            # path.stem already carries the pid; microseconds + a counter keep
+            # rotations within the same second from replacing each other
+            stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+            target, n = path.with_name(f"{path.stem}.{stamp}{path.suffix}"), 0
+            while target.exists():
+                n += 1
+                target = path.with_name(f"{path.stem}.{stamp}-{n}{path.suffix}")
+            path.rename(target)
+            self._day = today
@@ -0,0 +1,83 @@
+"""
+background_cache.py
+-------------------
+Disk cache for OpenAI-generated meme backgrounds.
+
+Entries are keyed by (image model, prompt, size); the generated bytes are
+stored content-addressed (blobs/<sha256>) with a small per-key index, and the
+store is bounded by total size (least recently used blobs are evicted first).
+Concurrent misses on the same key share a single generation, so a repeated
+prompt never pays for a second image.
+
+Previews may be served from a cached final-size image (it is downscaled at
+decode anyway); finals never use a preview-size image.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Optional
+
+from src.utils.config import (
+    BACKGROUND_CACHE_DIR,
+    BACKGROUND_CACHE_MB,
+    OPENAI_IMAGE_MODEL,
+    OPENAI_IMAGE_SIZE,
+    OPENAI_IMAGE_SIZE_PREVIEW,
+)
+from src.utils.disk_store import BlobStore, SingleFlight, atomic_write
+from src.utils.openai_client import openai_image_bytes
+
+
+class BackgroundCache:
+    def __init__(self, cache_dir=BACKGROUND_CACHE_DIR, disk_bytes: int = BACKGROUND_CACHE_MB * 1024 * 1024,
+                 model: str = OPENAI_IMAGE_MODEL):
+        self.dir = Path(cache_dir)
+        self.blobs = BlobStore(self.dir / "blobs", disk_bytes)
+        self.index = self.dir / "index"
+        self.model = model
+        self._flights = SingleFlight()
+        self.stats = {"hits": 0, "generated": 0}
+
+    # ---------- Public API ----------
+    def get(self, prompt: str, tier: str = "final") -> bytes:
+        """Background bytes for `prompt`, generating (once) on a miss."""
+        size = OPENAI_IMAGE_SIZE_PREVIEW if tier == "preview" else OPENAI_IMAGE_SIZE
+        sizes = [size] if size == OPENAI_IMAGE_SIZE else [size, OPENAI_IMAGE_SIZE]
+        for s in sizes:
+            data = self._lookup(self._key(prompt, s))
+            if data is not None:
+                self.stats["hits"] += 1
+                return data
+
+        key = self._key(prompt, size)
+        with self._flights.claim(key):
+            # Another request may have generated it while we waited
+            data = self._lookup(key)
+            if data is not None:
+                self.stats["hits"] += 1
+                return data
+            data = openai_image_bytes(prompt, size=size)
+            self.stats["generated"] += 1
+            self._store(key, data)
+            return data
+
+    def _key(self, prompt: str, size: str) -> str:
+        return hashlib.sha256(f"{self.model}\n{size}\n{prompt}".encode("utf-8")).hexdigest()
+
+    # ---------- Disk layer ----------
+    def _lookup(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self.index / f"{key}.json", "r", encoding="utf-8") as f:
+                digest = json.load(f)["digest"]
+            return self.blobs.read(digest)
+        except Exception:
+            return None
+
+    def _store(self, key: str, data: bytes) -> None:
+        # Blob first, then the index entry that points at it
+        digest = self.blobs.put(data)
+        atomic_write(self.index / f"{key}.json", json.dumps({"digest": digest}).encode("utf-8"))
+
+
+background_cache = BackgroundCache()
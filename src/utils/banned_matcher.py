@@ -0,0 +1,174 @@
+"""
+banned_matcher.py
+-----------------
+Multi-pattern banned-term matcher used by the compliance agent.
+
+Terms (single words or multi-word phrases) are compiled once into an
+Aho-Corasick automaton. Captions go through an obfuscation-normalization pass
+(case, unicode look-alikes, leetspeak, separators, spaced-out letters) and are
+scanned in a single linear pass.
+"""
+
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List
+
+# Cyrillic / Greek / fullwidth-style look-alikes that NFKD does not fold to ASCII
+_HOMOGLYPHS = str.maketrans({
+    "а": "a", "в": "b", "с": "c", "е": "e", "ё": "e", "һ": "h", "і": "i", "ї": "i",
+    "ј": "j", "к": "k", "м": "m", "н": "h", "о": "o", "р": "p", "ѕ": "s", "т": "t",
+    "у": "y", "х": "x", "ԁ": "d", "ɡ": "g", "ӏ": "l", "ա": "w",
+    "α": "a", "β": "b", "ε": "e", "η": "n", "ι": "i", "κ": "k", "ν": "v", "ο": "o",
+    "ρ": "p", "τ": "t", "υ": "u", "χ": "x", "ω": "w", "ς": "s",
+    "ß": "ss", "æ": "ae", "œ": "oe", "ø": "o", "ł": "l", "đ": "d", "ħ": "h", "ı": "i",
+})
+
+# Leetspeak substitutions; digits are always mapped, symbols only in the leet variant
+_LEET_DIGITS = {"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b", "9": "g"}
+_LEET_SYMBOLS = {"@": "a", "$": "s", "!": "i", "|": "l", "+": "t", "€": "e", "£": "l"}
+
+# Runs of at least this many single-letter tokens are joined ("k i l l" -> "kill")
+_MIN_SPACED_RUN = 3
+
+# Single-letter words that may lead a spaced run ("I k i l l" -> "i kill", not "ikill")
+_LETTER_WORDS = {"a", "i"}
+
+
+def _fold(text: str) -> str:
+    """Case-fold, strip accents and map homoglyphs."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return text.casefold().translate(_HOMOGLYPHS)
+
+
+def _tokens(folded: str, leet_symbols: bool) -> List[str]:
+    """Split into a-z tokens; everything else is a separator."""
+    out, cur = [], []
+    for ch in folded:
+        if "a" <= ch <= "z":
+            cur.append(ch)
+            continue
+        sub = _LEET_DIGITS.get(ch) or (_LEET_SYMBOLS.get(ch) if leet_symbols else None)
+        if sub:
+            cur.append(sub)
+        elif cur:
+            out.append("".join(cur))
+            cur = []
+    if cur:
+        out.append("".join(cur))
+    return out
+
+
+def _join_run(run: List[str], split_lead: bool) -> List[str]:
+    if split_lead and run[0] in _LETTER_WORDS and len(run) - 1 >= _MIN_SPACED_RUN:
+        return [run[0], "".join(run[1:])]
+    return ["".join(run)] if len(run) >= _MIN_SPACED_RUN else run
+
+
+def _join_spaced(tokens: List[str], split_lead: bool = False) -> List[str]:
+    """
+    Collapse runs of single-letter tokens into one word. With split_lead a
+    leading "a"/"i" stays a word of its own, as in "I k i l l".
+    """
+    out, run = [], []
+    for t in tokens:
+        if len(t) == 1:
+            run.append(t)
+            continue
+        if run:
+            out.extend(_join_run(run, split_lead))
+            run = []
+        out.append(t)
+    if run:
+        out.extend(_join_run(run, split_lead))
+    return out
+
+
+def normalize_variants(text: str) -> List[str]:
+    """
+    Normalized forms of `text`, each padded with spaces so that matching
+    " term " enforces word boundaries:
+      - symbols as separators  ("kill!"  -> " kill ")
+      - symbols as leetspeak   ("k!ll"   -> " kill ")
+    and, for each, spaced letters joined whole ("k i l l" -> " kill ") and
+    with a leading one-letter word kept apart ("I k i l l" -> " i kill ").
+    """
+    folded = _fold(text)
+    variants = []
+    for leet in (False, True):
+        tokens = _tokens(folded, leet)
+        for split_lead in (False, True):
+            v = " " + " ".join(_join_spaced(tokens, split_lead)) + " "
+            if v not in variants:
+                variants.append(v)
+    return variants
+
+
+def normalize_term(term: str) -> str:
+    """Normalized form of a policy term (no leet symbols, no spaced-letter joining)."""
+    return " ".join(_tokens(_fold(term), leet_symbols=False))
+
+
+class BannedTermMatcher:
+    """
+    Aho-Corasick automaton over normalized banned terms.
+    Build is O(total term length); `find` is O(len(caption) + matches).
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        self.size = 0
+        for term in terms:
+            norm = normalize_term(term)
+            if norm:
+                self._add(" " + norm + " ", term.strip().lower())
+        self._build()
+
+    def _add(self, pattern: str, term: str) -> None:
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        if term not in self._out[node]:
+            self._out[node].append(term)
+            self.size += 1
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                fn = self._goto[f].get(ch, 0)
+                self._fail[nxt] = fn if fn != nxt else 0
+                if self._out[self._fail[nxt]]:
+                    self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def _scan(self, text: str, hits: set) -> None:
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                hits.update(out[node])
+
+    def find(self, caption: str) -> List[str]:
+        """Return the sorted list of banned terms found in `caption`."""
+        hits: set = set()
+        if self.size:
+            for variant in normalize_variants(caption):
+                self._scan(variant, hits)
+        return sorted(hits)
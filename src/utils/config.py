@@ -39,10 +39,63 @@ LOGO_PATH     = os.getenv("LOGO_PATH", "data/brand/logo.png")
 DATA_DIR      = SRC_DIR / "data"
 FONTS_DIR     = DATA_DIR / "fonts"
 FONT_PATH     = os.getenv("FONT_PATH", str(FONTS_DIR / "Impact.ttf"))
+EMOJI_DIR     = Path(os.getenv("EMOJI_DIR", str(DATA_DIR / "emoji")))  # Twemoji PNGs, e.g. 1f602.png
+
+# Caches (template images, renders, backgrounds)
+CACHE_DIR                = Path(os.getenv("CACHE_DIR", str(SRC_DIR.parent / ".cache")))
+TEMPLATE_CACHE_DIR       = CACHE_DIR / "templates"
+TEMPLATE_MEM_CACHE_MB    = int(os.getenv("TEMPLATE_MEM_CACHE_MB", "256"))   # decoded pixels, total over API + render workers
+TEMPLATE_DISK_CACHE_MB   = int(os.getenv("TEMPLATE_DISK_CACHE_MB", "512"))  # original bytes
+TEMPLATE_REVALIDATE_SECS = int(os.getenv("TEMPLATE_REVALIDATE_SECS", "86400"))
+PREFETCH_WORKERS         = int(os.getenv("PREFETCH_WORKERS", "2"))       # background template fetchers (0 = off)
+PREFETCH_TOP_K           = int(os.getenv("PREFETCH_TOP_K", "6"))         # templates prefetched per search
+PREFETCH_TTL_SECS        = float(os.getenv("PREFETCH_TTL_SECS", "120"))  # queued prefetches older than this are dropped
+PREFETCH_MAX_PENDING     = int(os.getenv("PREFETCH_MAX_PENDING", "32"))  # oldest queued prefetches dropped beyond this
+BACKGROUND_CACHE_DIR     = CACHE_DIR / "backgrounds"
+BACKGROUND_CACHE_MB      = int(os.getenv("BACKGROUND_CACHE_MB", "512"))     # generated images on disk
+RENDER_CACHE_MB          = int(os.getenv("RENDER_CACHE_MB", "1024"))       # finished renders per output dir (LRU)
+
+# Template catalog and its precomputed text-safe regions (python -m src.precompute_regions)
+CATALOG_DIR           = SRC_DIR.parent / "data"
+TEMPLATE_CATALOG_FILE = Path(os.getenv("TEMPLATE_CATALOG_FILE", str(CATALOG_DIR / "templates.json")))
+TEMPLATE_REGIONS_FILE = Path(os.getenv("TEMPLATE_REGIONS_FILE", str(CATALOG_DIR / "template_regions.json")))
+AUTO_PLACE_CAPTIONS   = os.getenv("AUTO_PLACE_CAPTIONS", "true").lower() == "true"
+
+# Rendering: process pool for Pillow work (0 = render inline in the request thread)
+RENDER_WORKERS      = int(os.getenv("RENDER_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+RENDER_QUEUE_MAX    = int(os.getenv("RENDER_QUEUE_MAX", "64"))   # in-flight jobs before rejecting
+RENDER_TIMEOUT_SECS = float(os.getenv("RENDER_TIMEOUT_SECS", "30"))
 
 # Logs
 LOGS_DIR      = PROJ_DIR / "logs"
-COMPLIANCE_LOG= LOGS_DIR / "compliance_logs.csv"
+COMPLIANCE_LOG= LOGS_DIR / "compliance_logs.csv"  # written per process as compliance_logs.<pid>.csv
+COMPLIANCE_LOG_BATCH        = int(os.getenv("COMPLIANCE_LOG_BATCH", "100"))
+COMPLIANCE_LOG_FLUSH_SECS   = float(os.getenv("COMPLIANCE_LOG_FLUSH_SECS", "2"))
+COMPLIANCE_LOG_MAX_BYTES    = int(os.getenv("COMPLIANCE_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+COMPLIANCE_LOG_ROTATE_DAILY = os.getenv("COMPLIANCE_LOG_ROTATE_DAILY", "true").lower() == "true"
+
+# Animated templates (GIF/APNG/WebP in, GIF out): caption layer composited per frame
+ANIMATED_OUTPUT = os.getenv("ANIMATED_OUTPUT", "true").lower() == "true"
+ANIM_MAX_FRAMES = int(os.getenv("ANIM_MAX_FRAMES", "300"))
+ANIM_MAX_DIM    = int(os.getenv("ANIM_MAX_DIM", "640"))           # long side; larger frames are downscaled
+ANIM_PALETTE    = os.getenv("ANIM_PALETTE", "adaptive").lower()   # adaptive (per frame) | global | web
+ANIM_COLORS     = int(os.getenv("ANIM_COLORS", "256"))
+ANIM_DITHER     = os.getenv("ANIM_DITHER", "true").lower() == "true"
+
+# Editor sessions: decoded base image + per-box layers kept server-side between edits
+EDITOR_SESSION_MAX = int(os.getenv("EDITOR_SESSION_MAX", "32"))
+EDITOR_SESSION_TTL = int(os.getenv("EDITOR_SESSION_TTL", "900"))  # seconds since last use
+EDITOR_IDLE_MS     = int(os.getenv("EDITOR_IDLE_MS", "800"))      # live preview: full render after this much quiet
+
+# Output encoding: default preset (see src/utils/output_spec.py) and thumbnail widths, e.g. "256,512"
+OUTPUT_PRESET      = os.getenv("OUTPUT_PRESET", "final").strip().lower()
+OUTPUT_THUMB_SIZES = [int(s) for s in os.getenv("OUTPUT_THUMB_SIZES", "").split(",") if s.strip()]
+
+# Sprite sheets: all k results of a search in one image (square cells, SPRITE_COLS per row)
+SPRITE_CELL     = int(os.getenv("SPRITE_CELL", "256"))
+SPRITE_MAX_CELL = int(os.getenv("SPRITE_MAX_CELL", "512"))
+SPRITE_COLS     = int(os.getenv("SPRITE_COLS", "3"))
+SPRITE_FETCH_WORKERS = int(os.getenv("SPRITE_FETCH_WORKERS", "8"))  # concurrent template downloads per sheet
 
 # Models (free)
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
@@ -53,6 +106,17 @@ TOP_K_TEMPLATES = int(os.getenv("TOP_K_TEMPLATES", "10"))
 
 # Policy
 BANNED_WORDS_FILE = os.getenv("BANNED_WORDS_FILE", str(DATA_DIR / "policy" / "banned_words.txt"))
+COMPLIANCE_CACHE_SIZE = int(os.getenv("COMPLIANCE_CACHE_SIZE", "2048"))
+COMPLIANCE_CACHE_TTL  = int(os.getenv("COMPLIANCE_CACHE_TTL", "3600"))  # seconds
+
+# Toxicity backend: "remote" (HF inference API) or "local" (on-device CPU model)
+TOXICITY_BACKEND         = os.getenv("TOXICITY_BACKEND", "remote").strip().lower()
+TOXICITY_MODEL           = os.getenv("TOXICITY_MODEL", "unitary/toxic-bert")  # hub id or local dir
+TOXICITY_OFFLINE         = os.getenv("TOXICITY_OFFLINE", "true").lower() == "true"
+TOXICITY_BATCH_WINDOW_MS = int(os.getenv("TOXICITY_BATCH_WINDOW_MS", "10"))
+TOXICITY_MAX_BATCH       = int(os.getenv("TOXICITY_MAX_BATCH", "32"))
+TOXICITY_LOAD_TIMEOUT    = float(os.getenv("TOXICITY_LOAD_TIMEOUT", "120"))  # seconds a request waits for a cold load
+TOXICITY_FAIL_CLOSED     = os.getenv("TOXICITY_FAIL_CLOSED", "true").lower() == "true"  # block when the local model is unusable
 
 # Optional API keys
 HUGGINGFACE_API_TOKEN = os.getenv("HUGGINGFACE_API_TOKEN", "").strip()
@@ -65,6 +129,8 @@ USE_PAID_API       = os.getenv("USE_PAID_API", "true").lower() == "true"
 OPENAI_TEXT_MODEL  = os.getenv("OPENAI_TEXT_MODEL", "gpt-4o-mini")
 OPENAI_IMAGE_MODEL = os.getenv("OPENAI_IMAGE_MODEL", "gpt-image-1")
 OPENAI_TIMEOUT     = int(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_IMAGE_SIZE         = os.getenv("OPENAI_IMAGE_SIZE", "1024x1024")
+OPENAI_IMAGE_SIZE_PREVIEW = os.getenv("OPENAI_IMAGE_SIZE_PREVIEW", "").strip() or OPENAI_IMAGE_SIZE  # e.g. 512x512 on dall-e-2
 OPENAI_ORG_ID     = os.getenv("OPENAI_ORG_ID", "").strip()
 OPENAI_PROJECT_ID = os.getenv("OPENAI_PROJECT_ID", "").strip()
 
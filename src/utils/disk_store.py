@@ -0,0 +1,106 @@
+"""
+disk_store.py
+-------------
+Building blocks shared by the on-disk caches (template images, OpenAI
+backgrounds, finished renders):
+
+  - atomic_write: temp file + rename, so readers never see a torn file;
+  - BlobStore: content-addressed files (<dir>/<sha256>) bounded by total
+    size, least recently used first out (reads refresh the mtime);
+  - SingleFlight: per-key locks so concurrent misses on one key do the work
+    once. An entry lives until the last thread holding or waiting on it has
+    left, so a late arrival always joins the flight in progress instead of
+    starting a second one.
+"""
+
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+
+def atomic_write(path, data: bytes) -> None:
+    """Write `data` to `path` via a temp file in the same directory + rename."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class BlobStore:
+    def __init__(self, directory, max_bytes: int):
+        self.dir = Path(directory)
+        self.max_bytes = max_bytes
+
+    def path(self, digest: str) -> Path:
+        return self.dir / digest
+
+    def has(self, digest: str) -> bool:
+        return self.path(digest).exists()
+
+    def read(self, digest: str) -> bytes:
+        """Blob bytes (raises OSError when missing or evicted)."""
+        p = self.path(digest)
+        data = p.read_bytes()
+        try:
+            os.utime(p)  # LRU bookkeeping for eviction
+        except OSError:
+            pass
+        return data
+
+    def put(self, data: bytes) -> str:
+        """Store `data` (once per content) and return its sha256 digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.has(digest):
+            atomic_write(self.path(digest), data)
+            self.evict()
+        return digest
+
+    def evict(self) -> None:
+        # Dotfiles are other writers' temp files; callers' index entries of
+        # evicted blobs simply miss on the next lookup
+        try:
+            blobs = [(p.stat().st_mtime, p.stat().st_size, p) for p in self.dir.iterdir()
+                     if p.is_file() and not p.name.startswith(".")]
+        except OSError:
+            return
+        total = sum(size for _, size, _ in blobs)
+        for _, size, p in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except OSError:
+                pass
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, List] = {}  # key -> [lock, threads holding or waiting]
+
+    @contextmanager
+    def claim(self, key: str):
+        """Hold the per-key lock; callers re-check for the result once inside."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = [threading.Lock(), 0]
+            flight[1] += 1
+        try:
+            with flight[0]:
+                yield
+        finally:
+            with self._lock:
+                flight[1] -= 1
+                if not flight[1]:
+                    del self._flights[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._flights)
@@ -0,0 +1,141 @@
+"""
+emoji.py
+--------
+Emoji segmentation and the in-memory emoji sprite atlas.
+
+Segmentation is one compiled-regex pass over the caption that yields text runs
+and whole emoji graphemes: ZWJ sequences, skin-tone modifiers, variation
+selectors, keycaps, tag sequences and regional-indicator flags.
+
+The atlas lists the Twemoji-style PNGs in EMOJI_DIR (named by codepoints,
+e.g. 1f602.png or 1f468-200d-1f4bb.png) once, decodes each one the first
+time its grapheme is drawn, and keeps decoded sources and sprites pre-scaled
+per pixel size in bounded LRUs, so a render worker only holds the emoji it
+has actually drawn.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from src.utils.config import EMOJI_DIR
+
+_BASE = (
+    "\U0001F300-\U0001FAFF"      # pictographs, emoticons, transport, supplemental
+    "\U0001F000-\U0001F1E5"      # mahjong, cards, enclosed alphanumerics
+    "\U0001F200-\U0001F2FF"      # enclosed ideographics
+    "\U00002600-\U000027BF"      # misc symbols, dingbats
+    "\U0000231A-\U000023FF"      # watch, hourglass, media controls
+    "\U00002B05-\U00002B55"      # arrows, star, circle
+)
+_VS16, _VS15, _ZWJ, _KEYCAP = "\U0000FE0F", "\U0000FE0E", "\U0000200D", "\U000020E3"
+_MODS = f"(?:{_VS16}|{_VS15}|[\U0001F3FB-\U0001F3FF]|[\U000E0020-\U000E007F])*"
+_GRAPHEME = (
+    "[\U0001F1E6-\U0001F1FF]{2}"                                      # flags
+    f"|[0-9#*]{_VS16}?{_KEYCAP}"                                      # keycaps
+    f"|[\U000000A9\U000000AE\U0000203C\U00002049\U00002122\U00002139\U00002194-\U00002199]{_VS16}"  # text symbols forced to emoji
+    f"|[{_BASE}]{_MODS}(?:{_ZWJ}[{_BASE}]{_MODS})*"                   # base + modifiers, ZWJ-joined
+)
+_EMOJI_RE = re.compile(_GRAPHEME)
+_EMOJI_CHAR_RE = re.compile(f"[{_BASE}{_VS16}{_ZWJ}{_KEYCAP}\U0001F3FB-\U0001F3FF\U000E0020-\U000E007F]")
+
+
+def split_runs_by_emoji(text: str) -> List[Tuple[bool, str]]:
+    """[(is_emoji, segment)]: text runs are merged, every emoji grapheme is its own segment."""
+    runs: List[Tuple[bool, str]] = []
+    pos = 0
+    for m in _EMOJI_RE.finditer(text or ""):
+        if m.start() > pos:
+            runs.append((False, text[pos:m.start()]))
+        runs.append((True, m.group(0)))
+        pos = m.end()
+    if text and pos < len(text):
+        runs.append((False, text[pos:]))
+    return runs
+
+
+def is_emoji_char(ch: str) -> bool:
+    return bool(_EMOJI_CHAR_RE.match(ch))
+
+
+def twemoji_filename_for(grapheme: str) -> str:
+    return "-".join(format(ord(ch), "x") for ch in grapheme) + ".png"
+
+
+class EmojiAtlas:
+    """Emoji PNGs decoded on first use per grapheme; sources and scaled sprites in bounded LRUs."""
+
+    def __init__(self, emoji_dir=EMOJI_DIR, max_sprites: int = 2048, max_sources: int = 256):
+        self.dir = Path(emoji_dir)
+        self.max_sprites = max_sprites
+        self.max_sources = max_sources
+        self._names: Optional[Dict[str, Path]] = None
+        self._sources: "OrderedDict[str, Image.Image]" = OrderedDict()
+        self._sprites: "OrderedDict[Tuple[str, int], Image.Image]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _index(self) -> Dict[str, Path]:
+        """File names only (no decoding): codepoint key -> PNG path."""
+        with self._lock:
+            if self._names is None:
+                names = {}
+                if self.dir.is_dir():
+                    names = {p.stem.lower(): p for p in self.dir.glob("*.png")}
+                print(f"😀 Emoji atlas: {len(names)} sprites in {self.dir}")
+                self._names = names
+        return self._names
+
+    def _decode(self, name: str, path: Path) -> Optional[Image.Image]:
+        with self._lock:
+            hit = self._sources.get(name)
+            if hit is not None:
+                self._sources.move_to_end(name)
+                return hit
+        try:
+            with Image.open(path) as im:
+                src = im.convert("RGBA")
+        except Exception:
+            return None
+        with self._lock:
+            self._sources[name] = src
+            while len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+        return src
+
+    def _source_for(self, grapheme: str) -> Optional[Image.Image]:
+        names = self._names if self._names is not None else self._index()
+        if not names:
+            return None
+        key = twemoji_filename_for(grapheme)[:-4]
+        # Twemoji drops FE0F from most filenames
+        for name in (key, key.replace("-fe0f", "")):
+            if name in names:
+                return self._decode(name, names[name])
+        return None
+
+    def has(self, grapheme: str) -> bool:
+        return self._source_for(grapheme) is not None
+
+    def sprite(self, grapheme: str, size: int) -> Optional[Image.Image]:
+        key = (grapheme, size)
+        with self._lock:
+            hit = self._sprites.get(key)
+            if hit is not None:
+                self._sprites.move_to_end(key)
+                return hit
+        src = self._source_for(grapheme)
+        if src is None:
+            return None
+        im = src.resize((size, size), Image.LANCZOS)
+        with self._lock:
+            self._sprites[key] = im
+            while len(self._sprites) > self.max_sprites:
+                self._sprites.popitem(last=False)
+        return im
+
+
+emoji_atlas = EmojiAtlas()
@@ -0,0 +1,89 @@
+"""
+fonts.py
+--------
+Font discovery and caching for the Pillow renderers.
+
+Font files are resolved once at import (first candidate that opens), and
+FreeTypeFont objects are cached per (path, size). Sizes are bucketed so the
+cache stays small even when every template has a different width.
+"""
+
+from functools import lru_cache
+from typing import List, Optional
+
+from PIL import ImageFont
+
+from src.utils.config import FONT_PATH, FONTS_DIR
+
+MAIN_FONT_CANDIDATES = [
+    FONT_PATH,
+    str(FONTS_DIR / "impact.ttf"),
+    str(FONTS_DIR / "Impact.ttf"),
+    "src/data/fonts/impact.ttf",
+    "src/data/fonts/Impact.ttf",
+    "impact.ttf",
+    "Impact.ttf",
+    "arial.ttf",
+    "DejaVuSans.ttf",
+]
+
+EMOJI_FONT_CANDIDATES = [
+    r"C:\\Windows\\Fonts\\seguiemj.ttf",
+    r"C:\\Windows\\Fonts\\seguisym.ttf",
+    "/usr/share/fonts/truetype/noto/NotoColorEmoji.ttf",
+    "/usr/share/fonts/truetype/noto/NotoEmoji-Regular.ttf",
+    "/System/Library/Fonts/Apple Color Emoji.ttc",
+    str(FONTS_DIR / "NotoColorEmoji.ttf"),
+    str(FONTS_DIR / "NotoEmoji-Regular.ttf"),
+]
+
+MIN_FONT_SIZE = 12
+MAX_FONT_SIZE = 512
+
+
+def _resolve(candidates: List[str]) -> Optional[str]:
+    # Bitmap emoji fonts (NotoColorEmoji) only open at their strike size (109)
+    for path in candidates:
+        for size in (MIN_FONT_SIZE, 109):
+            try:
+                ImageFont.truetype(path, size)
+                return path
+            except Exception:
+                continue
+    return None
+
+
+MAIN_FONT_FILE = _resolve(MAIN_FONT_CANDIDATES)
+EMOJI_FONT_FILE = _resolve(EMOJI_FONT_CANDIDATES)
+print(f"🔤 Fonts: main={MAIN_FONT_FILE or 'PIL default'} emoji={EMOJI_FONT_FILE or 'none'}")
+
+
+def bucket_size(size: int) -> int:
+    """Exact up to 48px, then steps of 4 (<=128) and 8 (above), clamped."""
+    size = max(MIN_FONT_SIZE, min(MAX_FONT_SIZE, int(size)))
+    if size <= 48:
+        return size
+    step = 4 if size <= 128 else 8
+    return int(round(size / step) * step)
+
+
+@lru_cache(maxsize=256)
+def _truetype(path: str, size: int):
+    # Failed opens are cached as None too, so they are not retried per render
+    try:
+        return ImageFont.truetype(path, size)
+    except Exception:
+        return None
+
+
+def get_font(size: int):
+    """Impact-like main font at a bucketed size (PIL default font as last resort)."""
+    font = _truetype(MAIN_FONT_FILE, bucket_size(size)) if MAIN_FONT_FILE else None
+    return font or ImageFont.load_default()
+
+
+def get_emoji_font(size: int):
+    """Emoji-capable font at a bucketed size, or None when unavailable."""
+    if not EMOJI_FONT_FILE:
+        return None
+    return _truetype(EMOJI_FONT_FILE, bucket_size(size))
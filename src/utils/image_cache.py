@@ -0,0 +1,217 @@
+"""
+image_cache.py
+--------------
+Two-level cache for template images used by the Pillow renderers.
+
+  1) Memory: LRU of decoded RGB images, bounded by pixel bytes. Every process
+             that renders (the API process and each render worker) keeps its
+             own, so TEMPLATE_MEM_CACHE_MB is split evenly between them.
+  2) Disk:   content-addressed store of the original bytes (blobs/<sha256>)
+             plus a small per-URL index with ETag / Last-Modified, bounded by
+             total size (least recently used blobs are evicted first).
+
+Stale entries are revalidated with a conditional GET (304 keeps the cached
+bytes). Concurrent misses on the same URL share a single download.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import requests
+from PIL import Image
+
+from src.utils.config import (
+    TEMPLATE_CACHE_DIR,
+    TEMPLATE_MEM_CACHE_MB,
+    TEMPLATE_DISK_CACHE_MB,
+    TEMPLATE_REVALIDATE_SECS,
+    RENDER_WORKERS,
+)
+from src.utils.disk_store import BlobStore, SingleFlight, atomic_write
+
+
+def _image_bytes(img: Image.Image) -> int:
+    return img.width * img.height * len(img.getbands())
+
+
+def decode_reduced(data: bytes, max_dim: Optional[int] = None) -> Image.Image:
+    """
+    Decode to RGB, at reduced resolution when max_dim is set: JPEG uses the
+    decoder's DCT scaling (Image.draft), other formats an integer reduce().
+    The result is at least max_dim on its long side; callers resize the rest.
+    """
+    img = Image.open(BytesIO(data))
+    if max_dim and max(img.size) > max_dim:
+        ratio = max_dim / max(img.size)
+        if img.format == "JPEG":
+            img.draft("RGB", (max(1, int(img.width * ratio)), max(1, int(img.height * ratio))))
+        else:
+            factor = int(1 / ratio)
+            if factor >= 2:
+                img = img.reduce(factor)
+    return img.convert("RGB")
+
+
+# Per-process share of the memory layer: spawn workers import this module too
+# and would otherwise each hold the full budget of (mostly the same) templates
+MEM_BYTES_PER_PROCESS = TEMPLATE_MEM_CACHE_MB * 1024 * 1024 // (max(0, RENDER_WORKERS) + 1)
+
+
+class TemplateImageCache:
+    def __init__(self, cache_dir=TEMPLATE_CACHE_DIR, mem_bytes: int = MEM_BYTES_PER_PROCESS,
+                 disk_bytes: int = TEMPLATE_DISK_CACHE_MB * 1024 * 1024,
+                 revalidate_after: float = TEMPLATE_REVALIDATE_SECS):
+        self.dir = Path(cache_dir)
+        self.blobs = BlobStore(self.dir / "blobs", disk_bytes)
+        self.index = self.dir / "index"
+        self.mem_bytes = mem_bytes
+        self.revalidate_after = revalidate_after
+        self._mem: "OrderedDict[str, Tuple[str, Image.Image]]" = OrderedDict()
+        self._mem_used = 0
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self._meta: Dict[str, dict] = {}
+        self.stats = {"mem_hits": 0, "disk_hits": 0, "revalidated": 0, "downloads": 0}
+
+    # ---------- Public API ----------
+    def get_image(self, url: str, max_dim: Optional[int] = None) -> Image.Image:
+        """
+        Decoded RGB template image; callers get a private copy they may draw on.
+        With max_dim (preview tier) the cached bytes are decoded at reduced
+        resolution instead, bypassing the full-resolution memory layer.
+        """
+        if max_dim:
+            return decode_reduced(self.get_bytes(url)[1], max_dim)
+        return self._get_decoded(url)[1].copy()
+
+    def get_bytes(self, url: str) -> Tuple[str, bytes]:
+        """(sha256 digest, original bytes) of the template image."""
+        meta = self._fetch(url)
+        return meta["digest"], self.blobs.read(meta["digest"])
+
+    def digest(self, url: str) -> str:
+        return self._fetch(url)["digest"]
+
+    def is_cached(self, url: str) -> bool:
+        """True when `url` can be served without touching the network."""
+        meta = self._read_index(url)
+        return bool(meta) and not self._is_stale(meta) and self.blobs.has(meta["digest"])
+
+    def warm(self, url: str, decode: bool = False) -> str:
+        """Download (or revalidate) `url` ahead of use; with decode=True also fill the memory layer."""
+        if decode:
+            return self._get_decoded(url)[0]
+        return self._fetch(url)["digest"]
+
+    # ---------- Memory layer ----------
+    def _get_decoded(self, url: str) -> Tuple[str, Image.Image]:
+        with self._lock:
+            hit = self._mem.get(url)
+            if hit is not None:
+                self._mem.move_to_end(url)
+        if hit is not None and not self._is_stale(self._read_index(url)):
+            self.stats["mem_hits"] += 1
+            return hit
+
+        meta = self._fetch(url)
+        if hit is not None and hit[0] == meta["digest"]:
+            return hit
+        img = Image.open(BytesIO(self.blobs.read(meta["digest"])))
+        img = img.convert("RGB")
+        self._remember(url, meta["digest"], img)
+        return meta["digest"], img
+
+    def _remember(self, url: str, digest: str, img: Image.Image) -> None:
+        size = _image_bytes(img)
+        if size > self.mem_bytes:
+            return
+        with self._lock:
+            old = self._mem.pop(url, None)
+            if old is not None:
+                self._mem_used -= _image_bytes(old[1])
+            self._mem[url] = (digest, img)
+            self._mem_used += size
+            while self._mem_used > self.mem_bytes and self._mem:
+                _, (_, ev) = self._mem.popitem(last=False)
+                self._mem_used -= _image_bytes(ev)
+
+    # ---------- Disk layer ----------
+    def _fetch(self, url: str) -> dict:
+        """Index entry for `url`, downloading or revalidating if needed (single-flight)."""
+        if self.is_cached(url):
+            self.stats["disk_hits"] += 1
+            return self._read_index(url)
+
+        with self._flights.claim(url):
+            # Another thread may have finished the download while we waited
+            meta = self._read_index(url)
+            if meta and not self._is_stale(meta) and self.blobs.has(meta["digest"]):
+                return meta
+            return self._download(url, meta)
+
+    def _download(self, url: str, meta: Optional[dict]) -> dict:
+        headers = {}
+        have_blob = bool(meta) and self.blobs.has(meta["digest"])
+        if have_blob:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        r = requests.get(url, headers=headers, timeout=20)
+        if r.status_code == 304 and have_blob:
+            self.stats["revalidated"] += 1
+            meta["fetched_at"] = time.time()
+            self._write_index(url, meta)
+            return meta
+        r.raise_for_status()
+
+        digest = self.blobs.put(r.content)
+        self.stats["downloads"] += 1
+        meta = {
+            "url": url,
+            "digest": digest,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        }
+        self._write_index(url, meta)
+        return meta
+
+    def _is_stale(self, meta: Optional[dict]) -> bool:
+        if not meta:
+            return True
+        return time.time() - meta.get("fetched_at", 0) > self.revalidate_after
+
+    def _index_path(self, url: str) -> Path:
+        return self.index / (hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _read_index(self, url: str) -> Optional[dict]:
+        meta = self._meta.get(url)
+        if meta is not None:
+            return meta
+        try:
+            with open(self._index_path(url), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except Exception:
+            return None
+        self._meta[url] = meta
+        return meta
+
+    def _write_index(self, url: str, meta: dict) -> None:
+        self._meta[url] = meta
+        atomic_write(self._index_path(url), json.dumps(meta).encode("utf-8"))
+
+
+template_cache = TemplateImageCache()
+
+
+def get_template_image(url: str, max_dim: Optional[int] = None) -> Image.Image:
+    """Shorthand for template_cache.get_image(url, max_dim)."""
+    return template_cache.get_image(url, max_dim)
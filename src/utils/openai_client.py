@@ -99,19 +99,49 @@ def openai_moderate(text: str):
         return True, "openai_error"
 
 
+def openai_moderate_many(texts):
+    """
+    Batched variant of openai_moderate: one request for the whole list.
+    Returns [(ok: bool, reason: str), ...] in input order.
+    """
+    texts = list(texts)
+    if not client:
+        return [(True, "skip_openai")] * len(texts)
+    if not texts:
+        return []
 
-def openai_image(prompt, out_path="outputs/openai_image.png"):
+    try:
+        resp = client.moderations.create(
+            model="omni-moderation-latest",
+            input=texts,
+        )
+        out = []
+        for r in resp.results:
+            flagged = getattr(r, "flagged", False)
+            out.append((not flagged, "ok" if not flagged else "flagged"))
+        return out
+    except Exception as e:
+        print("⚠️ OpenAI moderation error:", e)
+        return [(True, "openai_error")] * len(texts)
+
+
+def openai_image_bytes(prompt, size: str = "1024x1024") -> bytes:
+    """Generated image as encoded bytes (no file written)."""
     if not client:
         raise RuntimeError("OpenAI client unavailable")
     resp = client.images.generate(
         model=OPENAI_IMAGE_MODEL,
         prompt=prompt,
-        size="1024x1024",
+        size=size,
     )
-    b64 = resp.data[0].b64_json
+    return base64.b64decode(resp.data[0].b64_json)
+
+
+def openai_image(prompt, out_path="outputs/openai_image.png"):
+    data = openai_image_bytes(prompt)
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
     with open(out_path, "wb") as f:
-        f.write(base64.b64decode(b64))
+        f.write(data)
     print("🖼️ OpenAI image generated ->", out_path)   # <- make sure this is present
     return out_path
 
@@ -0,0 +1,122 @@
+"""
+output_spec.py
+--------------
+Output encoder settings for rendered memes.
+
+An OutputSpec says how a rendered image is encoded: format (JPEG / WEBP /
+AVIF / PNG), quality, progressive/optimize flags and an optional max
+dimension. Named presets cover the common tiers; thumbnails are derived from
+the already-rendered image, so a full image plus its thumbnails cost a single
+decode and draw.
+"""
+
+from dataclasses import asdict, dataclass, replace
+from io import BytesIO
+from pathlib import Path
+from typing import List, Optional
+
+from PIL import Image
+
+from src.utils.config import OUTPUT_PRESET, OUTPUT_THUMB_SIZES
+
+_EXT = {"JPEG": ".jpg", "WEBP": ".webp", "AVIF": ".avif", "PNG": ".png", "GIF": ".gif"}
+MEDIA_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "AVIF": "image/avif", "PNG": "image/png", "GIF": "image/gif"}
+
+
+@dataclass(frozen=True)
+class OutputSpec:
+    format: str = "JPEG"
+    quality: int = 85
+    progressive: bool = False
+    optimize: bool = False
+    max_dim: Optional[int] = None
+    name: str = "custom"
+
+    @property
+    def ext(self) -> str:
+        return _EXT.get(self.format, ".jpg")
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES.get(self.format, "application/octet-stream")
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, d: Optional[dict]) -> "OutputSpec":
+        return cls(**d) if d else PRESETS["final"]
+
+
+PRESETS = {
+    "final":   OutputSpec("JPEG", 90, progressive=True, optimize=True, name="final"),
+    "web":     OutputSpec("WEBP", 82, max_dim=1280, name="web"),
+    "avif":    OutputSpec("AVIF", 60, max_dim=1280, name="avif"),
+    "preview": OutputSpec("WEBP", 70, max_dim=512, name="preview"),
+    "legacy":  OutputSpec("JPEG", 75, name="legacy"),  # Pillow defaults, as before presets existed
+}
+
+
+def _supported(fmt: str) -> bool:
+    if fmt == "AVIF":
+        try:
+            import pillow_avif  # noqa: F401  (registers AVIF on Pillow < 11.3)
+        except ImportError:
+            pass
+    Image.init()
+    return fmt in Image.SAVE
+
+
+_warned = set()
+
+def resolve(spec: OutputSpec) -> OutputSpec:
+    """Fall back to JPEG when this Pillow build cannot write the requested format."""
+    if _supported(spec.format):
+        return spec
+    if spec.format not in _warned:
+        _warned.add(spec.format)
+        print(f"⚠️ {spec.format} encoding unavailable, using JPEG")
+    return replace(spec, format="JPEG")
+
+
+def get_spec(preset: Optional[str] = None) -> OutputSpec:
+    """Named preset (falls back to OUTPUT_PRESET, then 'final'), resolved against this Pillow build."""
+    return resolve(PRESETS.get((preset or OUTPUT_PRESET or "final").lower(), PRESETS["final"]))
+
+
+def thumbnail_specs(spec: OutputSpec, sizes: Optional[List[int]] = None) -> List[OutputSpec]:
+    """Thumbnail variants of `spec` for each max dimension in `sizes` (default OUTPUT_THUMB_SIZES)."""
+    sizes = OUTPUT_THUMB_SIZES if sizes is None else sizes
+    return [replace(spec, max_dim=s, name=f"{spec.name}_{s}w", progressive=False) for s in sizes]
+
+
+def thumbnail_path(path: str, spec: OutputSpec) -> str:
+    p = Path(path)
+    return str(p.with_name(f"{p.stem}_{spec.max_dim}w{spec.ext}"))
+
+
+def fit_to(img: Image.Image, max_dim: Optional[int]) -> Image.Image:
+    if not max_dim or max(img.size) <= max_dim:
+        return img
+    out = img.copy()
+    out.thumbnail((max_dim, max_dim), Image.LANCZOS)
+    return out
+
+
+def encode(img: Image.Image, spec: OutputSpec) -> bytes:
+    spec = resolve(spec)
+    img = fit_to(img, spec.max_dim)
+    params = {}
+    if spec.format in ("JPEG", "WEBP", "AVIF"):
+        params["quality"] = spec.quality
+    if spec.format == "JPEG":
+        params.update(progressive=spec.progressive, optimize=spec.optimize)
+    elif spec.format == "WEBP":
+        params["method"] = 6 if spec.optimize else 4
+    elif spec.format == "PNG":
+        params["optimize"] = spec.optimize
+    if spec.format in ("JPEG",) and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    buf = BytesIO()
+    img.save(buf, spec.format, **params)
+    return buf.getvalue()
@@ -0,0 +1,130 @@
+"""
+prefetch.py
+-----------
+Background prefetch of template images right after retrieval.
+
+/templates returns k candidates and the next /generate almost always uses one
+of them, so their images are fetched into the template cache while the user
+is still choosing. The work is low priority and bounded:
+
+  - a couple of daemon threads (niced on Linux), never the request threads;
+  - a bounded queue, newest search first; older queued URLs are dropped when
+    it overflows and any queued URL expires after PREFETCH_TTL_SECS;
+  - a URL that is already cached, or that a request asks for before its
+    prefetch started, is cancelled (the request fetches it itself, and the
+    template cache's single-flight joins a download already in progress).
+
+Images are decoded into the memory layer only when rendering happens in this
+process (RENDER_WORKERS=0); render workers share the disk layer instead.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+from src.utils.config import PREFETCH_MAX_PENDING, PREFETCH_TTL_SECS, PREFETCH_WORKERS
+from src.utils.image_cache import template_cache
+from src.utils.render_pool import render_pool
+
+
+class TemplatePrefetcher:
+    def __init__(self, workers: int = PREFETCH_WORKERS, ttl: float = PREFETCH_TTL_SECS,
+                 max_pending: int = PREFETCH_MAX_PENDING):
+        self.workers = max(0, workers)
+        self.ttl = ttl
+        self.max_pending = max(1, max_pending)
+        self._pending: "OrderedDict[str, float]" = OrderedDict()  # url -> expiry; popped from the end
+        self._done: "OrderedDict[str, float]" = OrderedDict()     # prefetched url -> time, until used
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopped = False
+        self.stats = {"scheduled": 0, "fetched": 0, "cached": 0, "used": 0,
+                      "cancelled": 0, "expired": 0, "dropped": 0, "failed": 0}
+
+    # ---------- Public API ----------
+    def schedule(self, urls: Iterable[str]) -> int:
+        """Queue `urls` (best ranked first) for prefetch; returns how many were queued."""
+        if not self.workers:
+            return 0
+        expiry = time.monotonic() + self.ttl
+        with self._cond:
+            urls = [u for u in dict.fromkeys(urls) if u]
+            # Workers pop from the end: reversed so the top-ranked URL of the newest search goes first
+            for url in reversed(urls):
+                self._pending.pop(url, None)
+                self._pending[url] = expiry
+                self.stats["scheduled"] += 1
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+                self.stats["dropped"] += 1
+            self._start()
+            self._cond.notify_all()
+        return len(urls)
+
+    def note_use(self, url: Optional[str]) -> None:
+        """A request is about to render `url`: cancel its queued prefetch, count a prefetch hit."""
+        if not url:
+            return
+        with self._cond:
+            if self._pending.pop(url, None) is not None:
+                self.stats["cancelled"] += 1
+            if self._done.pop(url, None) is not None:
+                self.stats["used"] += 1
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._pending.clear()
+            self._cond.notify_all()
+
+    def info(self) -> dict:
+        with self._cond:
+            return dict(self.stats, pending=len(self._pending), workers=self.workers)
+
+    # ---------- Workers ----------
+    def _start(self) -> None:
+        while len(self._threads) < self.workers and not self._stopped:
+            t = threading.Thread(target=self._run, name=f"prefetch-{len(self._threads)}", daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def _next(self) -> Optional[str]:
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                while self._pending:
+                    url, expiry = self._pending.popitem(last=True)
+                    if expiry >= now:
+                        return url
+                    self.stats["expired"] += 1
+                self._cond.wait()
+            return None
+
+    def _run(self) -> None:
+        try:
+            # Linux: per-thread niceness, so prefetch yields the CPU to request threads
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            url = self._next()
+            if url is None:
+                return
+            if template_cache.is_cached(url) and render_pool.workers:
+                self.stats["cached"] += 1
+                continue
+            try:
+                template_cache.warm(url, decode=not render_pool.workers)
+                self.stats["fetched"] += 1
+                with self._cond:
+                    self._done[url] = time.time()
+                    while len(self._done) > 4 * self.max_pending:
+                        self._done.popitem(last=False)
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"⚠️ Template prefetch failed for {url}: {e}")
+
+
+template_prefetcher = TemplatePrefetcher()
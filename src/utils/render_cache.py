@@ -0,0 +1,136 @@
+"""
+render_cache.py
+---------------
+Content-addressed cache of finished renders in outputs/.
+
+A render is named by the hash of everything that determines its pixels and
+bytes: template image digest, caption or boxes, style, encoder spec and
+renderer version. Identical requests map to the same file, so a repeat is a
+file-existence check. Distinct requests never share a path, so concurrent
+renders cannot overwrite each other. Concurrent misses on the same key render
+once (single-flight).
+
+Each output directory is bounded by RENDER_CACHE_MB: every few writes the
+least recently used renders (a hit refreshes the mtime) are deleted together
+with their thumbnails / sprite maps. Files not named by the cache are never
+touched.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.utils.config import RENDER_CACHE_MB
+from src.utils.disk_store import SingleFlight
+from src.utils.image_cache import template_cache
+
+
+# How a job names its template image; replaced by the image digest in cache keys
+_SOURCE_KEYS = ("template_bytes", "template_path", "template_url", "template_raw", "template_digest")
+
+
+def source_digest(job: dict) -> str:
+    """sha256 of the template image a job renders onto."""
+    if job.get("template_digest"):
+        return job["template_digest"]
+    if job.get("template_bytes") is not None:
+        return hashlib.sha256(job["template_bytes"]).hexdigest()
+    if job.get("template_path"):
+        h = hashlib.sha256()
+        with open(job["template_path"], "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+    return template_cache.digest(job["template_url"])
+
+
+def render_key(job: dict, **extra) -> str:
+    """Stable hash of a render job (template source replaced by its digest) plus `extra`."""
+    payload = {k: v for k, v in job.items() if k not in _SOURCE_KEYS}
+    payload["source"] = source_digest(job)
+    payload.update(extra)
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, prefix: str = "meme", max_bytes: int = RENDER_CACHE_MB * 1024 * 1024,
+                 evict_every: int = 32):
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.evict_every = max(1, evict_every)
+        # <prefix>_<key[:24]> followed by the extension or a thumbnail suffix
+        self._name = re.compile(rf"^{re.escape(prefix)}_([0-9a-f]{{24}})[._]")
+        self._flights = SingleFlight()
+        self._lock = threading.Lock()
+        self._writes: Dict[str, int] = {}  # out_dir -> writes since its last eviction pass
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def path_for(self, out_dir, key: str, ext: str) -> Path:
+        return Path(out_dir) / f"{self.prefix}_{key[:24]}{ext}"
+
+    def lookup(self, path: Path) -> Optional[str]:
+        if path.exists():
+            self.hits += 1
+            try:
+                os.utime(path)  # LRU bookkeeping for eviction
+            except OSError:
+                pass
+            return str(path)
+        return None
+
+    def stored(self, out_dir) -> None:
+        """Count one render written to out_dir; every `evict_every` writes, trim it to max_bytes."""
+        d = str(out_dir)
+        with self._lock:
+            n = self._writes.get(d, 0) + 1
+            self._writes[d] = 0 if n >= self.evict_every else n
+        if n >= self.evict_every:
+            self.evict(d)
+
+    def evict(self, out_dir) -> None:
+        groups: Dict[str, List] = {}
+        try:
+            names = list(Path(out_dir).iterdir())
+        except OSError:
+            return
+        for p in names:
+            m = self._name.match(p.name)
+            if not m:
+                continue
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            groups.setdefault(m.group(1), []).append((p, st.st_mtime, st.st_size))
+        entries = [(max(f[1] for f in files), sum(f[2] for f in files), files) for files in groups.values()]
+        total = sum(size for _, size, _ in entries)
+        for _, size, files in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            # Main file first (shortest name): its presence is what makes a hit
+            for p, _, _ in sorted(files, key=lambda f: len(f[0].name)):
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+            total -= size
+            self.evicted += 1
+
+    def claim(self, key: str):
+        """Hold the per-key lock while checking for / producing one render."""
+        return self._flights.claim(key)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evicted": self.evicted,
+                "hit_rate": round(self.hits / total, 3) if total else 0}
+
+
+render_cache = RenderCache()
@@ -0,0 +1,126 @@
+"""
+render_pool.py
+--------------
+Process pool for CPU-bound Pillow work (decode, text drawing, encoding).
+
+Render jobs are plain dicts handed to a top-level job function in a worker
+process, so rendering is not serialized behind the API process's GIL. The
+number of in-flight jobs is bounded; callers get an error instead of an
+unbounded backlog (RenderRejected, also raised when a job overruns the
+timeout). Every job reports queue wait and run time.
+"""
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from src.utils.config import RENDER_WORKERS, RENDER_QUEUE_MAX, RENDER_TIMEOUT_SECS
+
+
+class RenderRejected(RuntimeError):
+    """The pool could not run a job: no slot freed up in time, or the job overran the timeout."""
+
+
+def _timed(fn: Callable, job: dict):
+    """Runs in the worker: (result, wall-clock start, run ms)."""
+    started = time.time()
+    t0 = time.perf_counter()
+    result = fn(job)
+    return result, started, (time.perf_counter() - t0) * 1000
+
+
+class RenderPool:
+    def __init__(self, workers: int = RENDER_WORKERS, max_queue: int = RENDER_QUEUE_MAX,
+                 timeout: float = RENDER_TIMEOUT_SECS):
+        self.workers = max(0, workers)
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(1, max_queue))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait_ms = 0.0
+        self.total_run_ms = 0.0
+        self.last_job = {}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: workers must not inherit the API process's threads/locks
+                ctx = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+                print(f"🧵 Render pool started ({self.workers} workers)")
+            return self._executor
+
+    def _reset(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def run(self, fn: Callable, job: dict):
+        """Run fn(job) on the pool (inline when RENDER_WORKERS=0) and return its result."""
+        self._acquire()
+        submitted = time.time()
+        if not self.workers:
+            try:
+                result, started, run_ms = _timed(fn, job)
+            finally:
+                self._slots.release()
+        else:
+            try:
+                fut = self._pool().submit(_timed, fn, job)
+            except BaseException:
+                self._slots.release()
+                raise
+            # The slot is held until the worker is really done, not until we stop
+            # waiting: a timed-out job keeps its slot while it still runs
+            fut.add_done_callback(lambda _: self._slots.release())
+            try:
+                result, started, run_ms = fut.result(timeout=self.timeout)
+            except FutureTimeout as e:
+                fut.cancel()  # only succeeds if it never started
+                self.timed_out += 1
+                raise RenderRejected(f"Render timed out after {self.timeout:g}s") from e
+            except BrokenProcessPool:
+                print("⚠️ Render pool broken, restarting and rendering inline")
+                self._reset()
+                self._acquire()
+                try:
+                    result, started, run_ms = _timed(fn, job)
+                finally:
+                    self._slots.release()
+        self._record(job, max(0.0, (started - submitted) * 1000), run_ms)
+        return result
+
+    def _acquire(self) -> None:
+        if not self._slots.acquire(timeout=self.timeout):
+            self.rejected += 1
+            raise RenderRejected("Render queue full")
+
+    def _record(self, job: dict, wait_ms: float, run_ms: float) -> None:
+        self.jobs += 1
+        self.total_wait_ms += wait_ms
+        self.total_run_ms += run_ms
+        self.last_job = {"kind": job.get("kind"), "wait_ms": round(wait_ms, 2), "run_ms": round(run_ms, 2)}
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "jobs": self.jobs,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": round(self.total_wait_ms / self.jobs, 2) if self.jobs else 0,
+            "avg_run_ms": round(self.total_run_ms / self.jobs, 2) if self.jobs else 0,
+            "last_job": self.last_job,
+        }
+
+    def shutdown(self) -> None:
+        self._reset()
+
+
+render_pool = RenderPool()
@@ -1,3 +1,5 @@
+import threading
+
 _last_image_provider = "unknown"
 
 def set_last_image_provider(name: str) -> None:
@@ -6,3 +8,27 @@ def set_last_image_provider(name: str) -> None:
 
 def get_last_image_provider() -> str:
     return _last_image_provider
+
+
+# Encoded output size / time per preset (what /outputs ends up serving)
+_encode_lock = threading.Lock()
+_encode_stats = {}
+
+def record_encode(preset: str, fmt: str, nbytes: int, encode_ms: float) -> None:
+    with _encode_lock:
+        s = _encode_stats.setdefault(preset, {"format": fmt, "count": 0, "bytes": 0, "encode_ms": 0.0})
+        s["count"] += 1
+        s["bytes"] += nbytes
+        s["encode_ms"] += encode_ms
+
+def get_encode_stats() -> dict:
+    with _encode_lock:
+        return {
+            name: {
+                "format": s["format"],
+                "count": s["count"],
+                "avg_bytes": s["bytes"] // s["count"],
+                "avg_encode_ms": round(s["encode_ms"] / s["count"], 2),
+            }
+            for name, s in _encode_stats.items()
+        }
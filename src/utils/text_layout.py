@@ -0,0 +1,70 @@
+"""
+text_layout.py
+--------------
+Auto-fit layout: the largest font size at which a caption, greedily wrapped,
+fits inside a box. Font sizes are binary-searched over the bucketed sizes of
+fonts.py and every probe reuses the cached word measurements, so a fit costs
+a handful of cached lookups (results are memoized for live editor previews).
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional
+
+from src.utils.fonts import bucket_size, get_font, get_emoji_font, MIN_FONT_SIZE, MAX_FONT_SIZE
+from src.utils.text_measure import get_measurer
+
+
+@dataclass(frozen=True)
+class TextLayout:
+    font_size: int
+    lines: List[str]
+    line_height: int      # baseline-to-baseline pitch, including line_gap
+    width: int            # widest line
+    height: int           # total block height
+    fits: bool
+
+
+def _line_height(font, line_gap: int) -> int:
+    try:
+        ascent, descent = font.getmetrics()
+        return ascent + descent + line_gap
+    except Exception:
+        return int(getattr(font, "size", 20) * 1.2) + line_gap
+
+
+def layout_at(text: str, size: int, box_w: int, box_h: int, line_gap: int = 6, stroke: int = 0) -> TextLayout:
+    """Wrap `text` at a given font size and report whether it fits the box."""
+    font = get_font(size)
+    measurer = get_measurer(font, get_emoji_font(size))
+    avail_w = max(1, box_w - 2 * stroke)
+    lines = measurer.wrap(text, avail_w)
+    width = max((measurer.line_width(ln) for ln in lines), default=0)
+    pitch = _line_height(font, line_gap)
+    height = len(lines) * pitch - line_gap + 2 * stroke if lines else 0
+    return TextLayout(bucket_size(size), lines, pitch, width, height,
+                      width <= avail_w and height <= box_h)
+
+
+@lru_cache(maxsize=2048)
+def fit_text(text: str, box_w: int, box_h: int, min_size: int = MIN_FONT_SIZE,
+             max_size: Optional[int] = None, line_gap: int = 6, stroke: int = 0) -> TextLayout:
+    """
+    Largest bucketed font size in [min_size, max_size] whose wrapped block fits
+    box_w x box_h. Falls back to min_size (overflowing) when nothing fits.
+    """
+    max_size = min(MAX_FONT_SIZE, max_size or box_h)
+    min_size = max(MIN_FONT_SIZE, min(min_size, max_size))
+    sizes = sorted({bucket_size(s) for s in range(min_size, max_size + 1)})
+
+    best = None
+    lo, hi = 0, len(sizes) - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        layout = layout_at(text, sizes[mid], box_w, box_h, line_gap, stroke)
+        if layout.fits:
+            best = layout
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    return best or layout_at(text, sizes[0], box_w, box_h, line_gap, stroke)
@@ -0,0 +1,105 @@
+"""
+text_measure.py
+---------------
+Shared text measurement for the Pillow renderers.
+
+Word advances are measured once per font and cached; line widths are built
+incrementally from cached words plus cached kerning pairs at the word/space
+boundaries, so greedy wrapping costs one FreeType call per new word instead
+of one per growing prefix.
+"""
+
+from functools import lru_cache
+from typing import Dict, List
+
+from src.utils.emoji import emoji_atlas, is_emoji_char, split_runs_by_emoji
+
+# Per-font cache bound; the word cache is simply reset when it fills up
+_MAX_CACHED_WORDS = 8192
+
+
+class TextMeasurer:
+    """Cached advances for one (main font, emoji font) pair."""
+
+    def __init__(self, font, emoji_font=None):
+        self.font = font
+        self.emoji_font = emoji_font
+        self._words: Dict[str, float] = {}
+        self._pairs: Dict[str, float] = {}
+        self.space = font.getlength(" ")
+
+    # ---------- Primitives ----------
+    def word_width(self, word: str) -> float:
+        w = self._words.get(word)
+        if w is None:
+            w = 0.0
+            for is_emoji, seg in split_runs_by_emoji(word):
+                if is_emoji and emoji_atlas.has(seg):
+                    w += getattr(self.font, "size", 32)  # pasted as a square sprite
+                    continue
+                f = (self.emoji_font or self.font) if is_emoji else self.font
+                w += f.getlength(seg)
+            if len(self._words) >= _MAX_CACHED_WORDS:
+                self._words.clear()
+            self._words[word] = w
+        return w
+
+    def _kern(self, a: str, b: str) -> float:
+        """Pair adjustment between two adjacent main-font characters."""
+        pair = a + b
+        k = self._pairs.get(pair)
+        if k is None:
+            if is_emoji_char(a) or is_emoji_char(b):
+                k = 0.0
+            else:
+                k = self.font.getlength(pair) - self.font.getlength(a) - self.font.getlength(b)
+            self._pairs[pair] = k
+        return k
+
+    def _joint(self, left: str, right: str) -> float:
+        """Width added between two words: one space plus kerning on both sides of it."""
+        w = self.space
+        if left:
+            w += self._kern(left[-1], " ")
+        if right:
+            w += self._kern(" ", right[0])
+        return w
+
+    # ---------- Lines ----------
+    def line_width(self, line: str) -> int:
+        words = line.split(" ")
+        total = sum(self.word_width(w) for w in words)
+        for left, right in zip(words, words[1:]):
+            total += self._joint(left, right)
+        return int(total)
+
+    def text_width(self, text: str) -> int:
+        """Widest line of a (possibly multi-line) string."""
+        if not text:
+            return 0
+        return max(self.line_width(ln) for ln in text.split("\n"))
+
+    def wrap(self, text: str, max_width: float) -> List[str]:
+        """Greedy word wrap; a word wider than max_width gets its own line."""
+        lines: List[str] = []
+        cur: List[str] = []
+        cur_w = 0.0
+        for word in text.split():
+            ww = self.word_width(word)
+            if cur:
+                new_w = cur_w + self._joint(cur[-1], word) + ww
+                if new_w <= max_width:
+                    cur.append(word)
+                    cur_w = new_w
+                    continue
+                lines.append(" ".join(cur))
+            cur, cur_w = [word], ww
+        if cur:
+            lines.append(" ".join(cur))
+        return lines
+
+
+@lru_cache(maxsize=128)
+def get_measurer(font, emoji_font=None) -> TextMeasurer:
+    """Shared measurer per font pair (fonts come from the fonts.py cache)."""
+    return TextMeasurer(font, emoji_font)
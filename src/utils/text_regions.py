@@ -0,0 +1,235 @@
+"""
+text_regions.py
+---------------
+Text-safe regions of meme templates, computed offline and looked up at
+render time.
+
+Analysis (offline, see src/precompute_regions.py) runs on a small grayscale
+copy of each template:
+  - panel splits: thin interior runs of rows/columns that are either one
+    uniform gray level contrasting with the content on both sides (a gutter)
+    or one continuous edge (a drawn border) cut the image into panels, rows
+    first, then columns inside each row. Flat areas and gradients inside a
+    picture are not gutters: they do not contrast with their neighbours;
+  - text-safe regions: in every panel, the horizontal band with the lowest
+    edge density in its top half and in its bottom half.
+
+Results are stored next to the catalog (data/template_regions.json) keyed by
+the template image digest. At request time placing N captions is a dict
+lookup plus a choice among the stored regions; no pixels are touched.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from src.utils.config import TEMPLATE_REGIONS_FILE
+
+# Bump when the analysis changes; older entries are recomputed by the offline pass
+REGIONS_VERSION = 2
+
+ANALYSIS_DIM = 256        # long side of the analysed copy
+BAND_FRACTION = 0.22      # caption band height, as a fraction of the panel height
+MIN_PANEL_FRACTION = 0.2  # splits that would leave a thinner panel are ignored
+MAX_GUTTER_FRACTION = 0.06  # separator runs thicker than this are not panel gutters
+EDGE_THRESHOLD = 24       # gray-level step that counts as an edge
+GUTTER_STD = 6.0          # max std-dev of a uniform separator line
+GUTTER_CONTRAST = 24.0    # min mean gray-level difference between a gutter and the content beside it
+CONTRAST_CONTEXT = 0.02   # lines on each side compared with a gutter, as a fraction of the image
+BORDER_COVERAGE = 0.9     # fraction of a line that must be edge pixels to count as a border
+
+Rect = Tuple[float, float, float, float]  # normalized (x, y, w, h)
+
+
+# ---------- Analysis (offline) ----------
+def _edges(gray: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(horizontal-line edge map, vertical-line edge map) as booleans, same shape as `gray`."""
+    dy = np.zeros_like(gray, dtype=bool)
+    dx = np.zeros_like(gray, dtype=bool)
+    dy[1:, :] = np.abs(np.diff(gray, axis=0)) > EDGE_THRESHOLD
+    dx[:, 1:] = np.abs(np.diff(gray, axis=1)) > EDGE_THRESHOLD
+    return dy, dx
+
+
+def _separator_runs(gray: np.ndarray, line_edges: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    [start, stop) runs of lines that separate panels: a thin uniform run that
+    contrasts with the content on both sides of it (a gutter), or a thin run
+    of lines that are one continuous edge (a drawn border).
+    """
+    n = gray.shape[0]
+    std, mean = gray.std(axis=1), gray.mean(axis=1)
+    border = line_edges.mean(axis=1) > BORDER_COVERAGE
+    ctx = max(1, int(n * CONTRAST_CONTEXT))
+
+    def contrast(a: int, b: int, level: float) -> float:
+        # How far the lines in [a, b) are from the separator's gray level, per pixel
+        a, b = max(0, a), min(n, b)
+        return float(np.abs(gray[a:b] - level).mean()) if b > a else 0.0
+
+    runs, i = [], 0
+    while i < n:
+        j = i + 1
+        if border[i]:
+            while j < n and border[j]:
+                j += 1
+            runs.append((i, j))
+        elif std[i] < GUTTER_STD:
+            # One gutter is one gray level; a slow drift (a gradient) ends the run
+            while j < n and std[j] < GUTTER_STD and abs(mean[j] - mean[i]) <= GUTTER_STD:
+                j += 1
+            # Both sides must differ from it: a flat area next to a similar one is not a gutter
+            if i > 0 and j < n and min(contrast(i - ctx, i, mean[i]), contrast(j, j + ctx, mean[i])) > GUTTER_CONTRAST:
+                runs.append((i, j))
+        i = j
+    return [(a, b) for a, b in runs if b - a <= n * MAX_GUTTER_FRACTION]
+
+
+def _split_points(gray: np.ndarray, line_edges: np.ndarray) -> List[int]:
+    """Row indices where `gray` (rows = candidate lines) is cut by a gutter or a border."""
+    n = gray.shape[0]
+    lo, hi = int(n * MIN_PANEL_FRACTION), int(n * (1 - MIN_PANEL_FRACTION))
+    cuts = [(a + b - 1) // 2 for a, b in _separator_runs(gray, line_edges)]
+    kept, prev = [], 0
+    for c in cuts:
+        if lo <= c <= hi and c - prev >= n * MIN_PANEL_FRACTION and n - c >= n * MIN_PANEL_FRACTION:
+            kept.append(c)
+            prev = c
+    return kept
+
+
+def _panels(gray: np.ndarray, dy: np.ndarray, dx: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """Panels in reading order as pixel rects (x0, y0, x1, y1): row bands, then columns within each."""
+    h, w = gray.shape
+    panels = []
+    rows = [0] + _split_points(gray, dy) + [h]
+    for y0, y1 in zip(rows, rows[1:]):
+        band = gray[y0:y1]
+        cols = [0] + _split_points(band.T, dx[y0:y1].T) + [w]
+        for x0, x1 in zip(cols, cols[1:]):
+            panels.append((x0, y0, x1, y1))
+    return panels
+
+
+def _quiet_band(density: np.ndarray, start: int, stop: int, band: int) -> Tuple[int, float]:
+    """(offset, mean density) of the `band`-row window with the least edge density in rows [start, stop)."""
+    stop = max(stop, start + band)
+    csum = np.concatenate([[0.0], np.cumsum(density[start:stop])])
+    means = (csum[band:] - csum[:-band]) / band
+    i = int(np.argmin(means))
+    return start + i, float(means[i])
+
+
+def analyze(img: Image.Image) -> dict:
+    """Panels and text-safe regions of one template image (any size; analysed downscaled)."""
+    small = img.convert("L")
+    small.thumbnail((ANALYSIS_DIM, ANALYSIS_DIM))
+    gray = np.asarray(small, dtype=np.int16)
+    h, w = gray.shape
+    dy, dx = _edges(gray)
+    edges = dy | dx
+
+    def norm(x0, y0, x1, y1) -> List[float]:
+        return [round(x0 / w, 4), round(y0 / h, 4), round((x1 - x0) / w, 4), round((y1 - y0) / h, 4)]
+
+    panels, regions = [], []
+    for i, (x0, y0, x1, y1) in enumerate(_panels(gray, dy, dx)):
+        panels.append(norm(x0, y0, x1, y1))
+        ph = y1 - y0
+        band = max(1, int(ph * BAND_FRACTION))
+        # Ignore a thin margin so panel borders do not count against the band
+        mx, my = max(1, (x1 - x0) // 25), max(1, ph // 25)
+        rows = edges[y0:y1, x0 + mx:max(x0 + mx + 1, x1 - mx)].mean(axis=1)
+        half = ph // 2
+        for where, (start, stop) in (("top", (my, half)), ("bottom", (half, ph - my))):
+            off, density = _quiet_band(rows, start, max(start + band, stop), band)
+            off = min(off, ph - band)
+            regions.append({"panel": i, "where": where, "density": round(density, 4),
+                            "box": norm(x0 + mx, y0 + off, x1 - mx, y0 + off + band)})
+    return {"version": REGIONS_VERSION, "size": list(img.size), "panels": panels, "regions": regions}
+
+
+# ---------- Placement (request time) ----------
+def place(record: Optional[dict], n: int) -> Optional[List[Rect]]:
+    """
+    Boxes for `n` captions in reading order, or None to keep the default
+    top/bottom placement. Multi-panel templates get the quietest regions,
+    spread over distinct panels first.
+    """
+    if not record or n < 1 or record.get("version") != REGIONS_VERSION:
+        return None
+    regions = record.get("regions") or []
+    panels = record.get("panels") or []
+    if len(panels) <= 1 and n <= 2:
+        # Single panel: classic top/bottom order, each part in the quietest band of its half
+        by_where = {r["where"]: r for r in regions}
+        order = ["bottom"] if n == 1 else ["top", "bottom"]
+        if all(w in by_where for w in order):
+            return [tuple(by_where[w]["box"]) for w in order]
+        return None
+    if n > len(regions):
+        return None
+
+    # Quietest region of each panel first (so n == panels gives one per panel), then the rest
+    ranked = sorted(regions, key=lambda r: r["density"])
+    chosen, used = [], set()
+    for r in ranked:
+        if len(chosen) < n and r["panel"] not in used:
+            chosen.append(r)
+            used.add(r["panel"])
+    for r in ranked:
+        if len(chosen) < n and r not in chosen:
+            chosen.append(r)
+    chosen.sort(key=lambda r: (r["panel"], r["box"][1]))
+    return [tuple(r["box"]) for r in chosen]
+
+
+class TemplateRegions:
+    """Read-only view of the precomputed regions file (reloaded when the file changes)."""
+
+    def __init__(self, path=TEMPLATE_REGIONS_FILE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._data: Dict[str, dict] = {"templates": {}, "urls": {}}
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return self._data
+        with self._lock:
+            if mtime != self._mtime:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                    self._data = {"templates": data.get("templates") or {}, "urls": data.get("urls") or {}}
+                except Exception as e:
+                    print("⚠️ Could not read template regions:", e)
+                self._mtime = mtime
+            return self._data
+
+    def get(self, digest: Optional[str] = None, url: Optional[str] = None) -> Optional[dict]:
+        """Stored record for a template image (by digest, or by the URL it was analysed from)."""
+        data = self._load()
+        if not digest and url:
+            digest = data["urls"].get(url)
+        rec = data["templates"].get(digest) if digest else None
+        return rec if rec and rec.get("version") == REGIONS_VERSION else None
+
+    def stamp(self) -> float:
+        """Changes whenever the regions file does (for cache keys of renders that look regions up late)."""
+        self._load()
+        return self._mtime or 0.0
+
+    def stats(self) -> dict:
+        data = self._load()
+        return {"templates": len(data["templates"]), "file": str(self.path), "version": REGIONS_VERSION}
+
+
+template_regions = TemplateRegions()
@@ -0,0 +1,46 @@
+"""Obfuscation normalization of the banned-term matcher (src/utils/banned_matcher.py)."""
+
+import pytest
+
+from src.utils.banned_matcher import BannedTermMatcher
+
+TERMS = ["kill", "hate", "hate speech"]
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return BannedTermMatcher(TERMS)
+
+
+@pytest.mark.parametrize("caption, expected", [
+    ("i will kill it", ["kill"]),
+    ("KILL!!", ["kill"]),
+    # leetspeak
+    ("k!ll them", ["kill"]),
+    ("k1ll", ["kill"]),
+    ("h4te", ["hate"]),
+    # spaced / dotted letters, also after a one-letter word
+    ("k i l l", ["kill"]),
+    ("k.i.l.l", ["kill"]),
+    ("I k i l l", ["kill"]),
+    ("a k i l l er", ["kill"]),
+    # homoglyphs and accents
+    ("кill", ["kill"]),
+    ("kíll", ["kill"]),
+    # phrases across extra whitespace
+    ("hate   speech", ["hate", "hate speech"]),
+])
+def test_obfuscations_are_caught(matcher, caption, expected):
+    assert matcher.find(caption) == expected
+
+
+@pytest.mark.parametrize("caption", [
+    "skill issue",
+    "skill",
+    "i killed time",
+    "whatever",
+    "w h a t e v e r",
+    "killjoy",
+])
+def test_innocent_words_are_not_flagged(matcher, caption):
+    assert matcher.find(caption) == []
@@ -0,0 +1,45 @@
+"""Editor session frames must match a full layout render of the same boxes (src/agents/editor_session.py)."""
+
+import numpy as np
+import pytest
+from PIL import Image, ImageChops
+
+import src.agents.editor_session as editor_session
+from src.agents.editor_session import EditorSession
+from src.agents.meme_generator_agent import _draw_layout_boxes
+
+BOXES = [
+    {"text": "when the frame matches", "x": 0.1, "y": 0.05, "width": 0.8, "font_scale": 0.06},
+    # One word wider than its box, centred: the line starts left of the box and ends right of it
+    {"text": "SUPERCALIFRAGILISTICEXPIALIDOCIOUSWORD", "x": 0.35, "y": 0.8, "width": 0.3, "font_scale": 0.06},
+    {"text": "right aligned", "x": 0.5, "y": 0.45, "width": 0.4, "align": "right", "font_scale": 0.05},
+    {"text": "auto fit in a box with a height", "x": 0.05, "y": 0.55, "width": 0.4, "height": 0.2},
+]
+
+
+@pytest.fixture
+def base(monkeypatch):
+    rng = np.random.default_rng(3)
+    img = Image.fromarray(rng.integers(0, 256, (384, 512, 3), dtype=np.uint8))
+    monkeypatch.setattr(editor_session, "get_template_image", lambda url, max_dim=None: img.copy())
+    return img
+
+
+def _full_render(base: Image.Image, boxes) -> Image.Image:
+    img = base.copy()
+    _draw_layout_boxes(img, boxes)
+    return img
+
+
+def test_frame_matches_full_render(base):
+    session = EditorSession({"url": "template"})
+    session.set_boxes(BOXES)
+    assert ImageChops.difference(session.frame, _full_render(base, BOXES)).getbbox() is None
+
+
+def test_frame_matches_after_edits(base):
+    session = EditorSession({"url": "template"})
+    session.set_boxes(BOXES)
+    edited = [dict(BOXES[0], text="edited"), BOXES[1], dict(BOXES[2], x=0.1)]
+    assert session.set_boxes(edited) == [0, 2]
+    assert ImageChops.difference(session.frame, _full_render(base, edited)).getbbox() is None
@@ -0,0 +1,48 @@
+"""Panel detection and caption placement on synthetic templates (src/utils/text_regions.py)."""
+
+import numpy as np
+from PIL import Image
+
+from src.utils.text_regions import analyze, place
+
+
+def _photo(w: int, h: int, seed: int) -> Image.Image:
+    """Photo-like stand-in: smooth random shapes plus sensor noise, no flat lines."""
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (h // 16, w // 16, 3), dtype=np.uint8)
+    base = np.asarray(Image.fromarray(coarse).resize((w, h), Image.BICUBIC), dtype=float)
+    return Image.fromarray(np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8))
+
+
+def _grid(cells, gutter: int = 20, margin: int = 10) -> Image.Image:
+    """2x2 comic: the four cells on white, separated by white gutters."""
+    w, h = cells[0].size
+    sheet = Image.new("RGB", (2 * w + gutter + 2 * margin, 2 * h + gutter + 2 * margin), "white")
+    for i, cell in enumerate(cells):
+        sheet.paste(cell, (margin + (i % 2) * (w + gutter), margin + (i // 2) * (h + gutter)))
+    return sheet
+
+
+def test_single_photo_is_one_panel():
+    assert len(analyze(_photo(800, 600, seed=1))["panels"]) == 1
+
+
+def test_linear_gradient_is_one_panel():
+    ramp = np.tile(np.linspace(0, 255, 600, dtype=np.uint8)[:, None], (1, 800))
+    assert len(analyze(Image.fromarray(ramp))["panels"]) == 1
+
+
+def test_two_by_two_grid_is_four_panels():
+    rec = analyze(_grid([_photo(400, 300, seed=s) for s in range(4)]))
+    assert len(rec["panels"]) == 4
+
+
+def test_two_by_two_grid_of_flat_panels_is_four_panels():
+    cells = [Image.new("RGB", (400, 300), (60 * i, 120, 200)) for i in range(4)]
+    assert len(analyze(_grid(cells))["panels"]) == 4
+
+
+def test_two_captions_on_a_photo_go_top_and_bottom():
+    top, bottom = place(analyze(_photo(800, 600, seed=2)), 2)
+    assert top[1] + top[3] <= 0.5 <= bottom[1]
+    assert top[3] >= 0.15 and bottom[3] >= 0.15
@@ -0,0 +1,12 @@
+"""Visual parity of the single-pass stroke caption renderer with the legacy offset-grid outline."""
+
+import pytest
+
+from src.benchmarks.bench_text_render import CAPTIONS, MAX_CHANGED_PCT, MAX_MEAN_DIFF, parity
+
+
+@pytest.mark.parametrize("caption", list(CAPTIONS.values()), ids=[f"{n}-chars" for n in CAPTIONS])
+def test_stroke_matches_legacy_outline(caption):
+    mean, changed = parity(caption)
+    assert mean <= MAX_MEAN_DIFF
+    assert changed <= MAX_CHANGED_PCT